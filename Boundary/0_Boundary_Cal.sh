@@ -8,6 +8,7 @@
 #-----------------------------Required resources-----------------------
 #SBATCH --time=60
 #SBATCH --mem=250000
+#SBATCH --cpus-per-task=8
 
 #--------------------Environment, Operations and Job steps-------------
 
@@ -22,38 +23,12 @@ GetGlobalFlow(){
 # GetGlobalFlow
 
 # 2. Cut the baseflow and runoff for 4 basins
+# (nearest neighbour onto each range.txt, like cdo invertlat + remapnn, with cached index maps)
 CutFlow(){
-
-    # baseflow
-    cdo invertlat \
-    /lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_baseflow/monthly_baseflow_ensembleMean_1986-2015.nc \
-    /lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_baseflow/monthly_baseflow_ensembleMean_1986-2015_latfix.nc
-
-    # runoff
-    cdo invertlat \
-    /lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_runoff/monthly_runoff_ensembleMean_1986-2015.nc \
-    /lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_runoff/monthly_runoff_ensembleMean_1986-2015_latfix.nc
-
-    basins=("LaPlata" "Indus" "Yangtze" "Rhine")
-
-    for basin in "${basins[@]}"; do
-        range_file="/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea/${basin}/range.txt"
-        outdir="/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea/${basin}/Hydro"
-        mkdir -p "$outdir"
-
-        # baseflow
-        cdo remapnn,$range_file \
-            /lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_baseflow/monthly_baseflow_ensembleMean_1986-2015_latfix.nc \
-            ${outdir}/${basin}_monthly_baseflow_1986-2015.nc
-
-        # runoff
-        cdo remapnn,$range_file \
-            /lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_runoff/monthly_runoff_ensembleMean_1986-2015_latfix.nc \
-            ${outdir}/${basin}_monthly_runoff_1986-2015.nc
-
-        echo "Done $basin"
-    done
-
+    source /home/WUR/zhou111/miniconda3/etc/profile.d/conda.sh
+    conda activate myenv
+    python /lustre/nobackup/WUR/ESG/zhou111/1_RQ1_Code/3_Results_Analysis/Boundary/1_Cut_VIC_flow.py
+    conda deactivate
 }
 # CutFlow
 
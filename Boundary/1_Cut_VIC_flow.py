@@ -0,0 +1,26 @@
+# Cut the global monthly VIC baseflow and runoff (ensemble mean) for the study basins.
+# Nearest-neighbour onto each basin's range.txt grid, like `cdo invertlat` + `cdo remapnn`,
+# but every global file is read once for all basins and the index maps are cached.
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.regrid import cut_basins
+
+global_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global"
+basin_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
+
+basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
+flows = {
+    "baseflow": os.path.join(global_dir, "VIC_baseflow", "monthly_baseflow_ensembleMean_1986-2015.nc"),
+    "runoff": os.path.join(global_dir, "VIC_runoff", "monthly_runoff_ensembleMean_1986-2015.nc"),
+}
+
+for flow, src_file in flows.items():
+    targets = {
+        basin: (os.path.join(basin_dir, basin, "range.txt"),
+                os.path.join(basin_dir, basin, "Hydro", f"{basin}_monthly_{flow}_1986-2015.nc"))
+        for basin in basins
+    }
+    for out_file in cut_basins(src_file, targets):
+        print(f"Saved {out_file}")
@@ -1,5 +1,10 @@
 import xarray as xr
 import glob
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.ensemble import ensemble_stats, open_concat
 
 # path pattern
 path = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_baseflow/"
@@ -7,13 +12,19 @@ path = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_baseflow/"
 # all models
 models = ['GFDL-ESM4','IPSL-CM6A-LR','MPI-ESM1-2-HR','MRI-ESM2-0','UKESM1-0-LL']
 
+# Months per chunk of the ensemble statistics
+chunk_months = 60
+
+# True: also write all models stacked along a "model" dimension (written lazily)
+write_all_models = True
+
 datasets = {}
 
 
 for model in models:
     files = sorted(glob.glob(f"{path}monthly_baseflow_{model}_*.nc"))
-    dsets = [xr.open_dataset(f) for f in files]
-    ds = xr.concat(dsets, dim="time")                      # concatenate along time
+    files = [f for f in files if not f.endswith("_1986-2015.nc")]  # skip outputs of earlier runs
+    ds = open_concat(files, dim="time")                    # concatenate along time (lazy)
     ds = ds.sel(time=slice("1986-01-01","2015-12-31"))     # subset time
     datasets[model] = ds
 
@@ -22,17 +33,14 @@ for model, ds in datasets.items():
     ds.to_netcdf(out)
 
 
-# add a model dimension to each dataset
-datasets_expanded = []
-for model, ds in datasets.items():
-    datasets_expanded.append(ds.expand_dims(model=[model]))
-
-# concatenate along model
-combined = xr.concat(datasets_expanded, dim="model")
+if write_all_models:
+    # add a model dimension to each dataset and concatenate along model
+    combined = xr.concat([ds.expand_dims(model=[model]) for model, ds in datasets.items()], dim="model")
+    combined.to_netcdf(f"{path}monthly_baseflow_allModels_1986-2015.nc")
 
-# ensemble mean across models
-ensemble_mean = combined.mean(dim="model")
+# ensemble mean and spread across models, one chunk of months at a time
+ensemble_mean, ensemble_spread = ensemble_stats(datasets, dim="time", chunk=chunk_months)
 
 # save
-combined.to_netcdf(f"{path}monthly_baseflow_allModels_1986-2015.nc")
 ensemble_mean.to_netcdf(f"{path}monthly_baseflow_ensembleMean_1986-2015.nc")
+ensemble_spread.to_netcdf(f"{path}monthly_baseflow_ensembleSpread_1986-2015.nc")
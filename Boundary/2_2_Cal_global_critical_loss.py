@@ -3,8 +3,8 @@ import numpy as np
 import os
 
 # Input paths
-baseflow_nc = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_baseflow/monthly_baseflow_ensembleMean_1986-2015_latfix.nc"
-runoff_nc   = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_runoff/monthly_runoff_ensembleMean_1986-2015_latfix.nc"
+baseflow_nc = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_baseflow/monthly_baseflow_ensembleMean_1986-2015.nc"
+runoff_nc   = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/VIC_runoff/monthly_runoff_ensembleMean_1986-2015.nc"
 cropland_frac_nc = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/1_Global/Boundary/Cropland_Frac.nc"
 
 # Output directory
@@ -16,10 +16,11 @@ N_crit_conc_river = 2.5
 N_nat_conc_runoff = 0.5
 
 # --- Load datasets ---
-ds_baseflow = xr.open_dataset(baseflow_nc)
+# Latitude inverted on reading (a reversed view, as `cdo invertlat` did for the former _latfix copies)
+ds_baseflow = xr.open_dataset(baseflow_nc).isel(lat=slice(None, None, -1))
 baseflow = ds_baseflow[list(ds_baseflow.data_vars)[0]]
 
-ds_runoff = xr.open_dataset(runoff_nc)
+ds_runoff = xr.open_dataset(runoff_nc).isel(lat=slice(None, None, -1))
 runoff = ds_runoff[list(ds_runoff.data_vars)[0]]
 
 ds_crop_frac = xr.open_dataset(cropland_frac_nc)
@@ -1,118 +1,78 @@
 # This code is used to calculate the fraction of cropland area for major crops in terms of total cropland
 
 import os
+import re
+import sys
+import dask
 import numpy as np
 import xarray as xr
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.cube import open_crop_cube
+from Utils.manifest import is_current, load_manifest, record, save_manifest
+
 # Define paths
 input_path = "/lustre/nobackup/WUR/ESG/zhou111/Data/Raw/SPAM/SPAM2010_HA_nc"
 output_path = "/lustre/nobackup/WUR/ESG/zhou111/Data/Raw/SPAM/SPAM2010_HA_nc"
+output_file = os.path.join(output_path, "MainCrop_Fraction_05d.nc")
 
 # Define main crops
 main_crops = ["RICE", "WHEA", "MAIZ", "SOYB"]
 
-# Get all the crop files
-all_nc_files = [f for f in os.listdir(input_path) if f.endswith("_Harvest_Area_05d.nc")]
-all_crops = [f.split("_")[0] for f in all_nc_files]
+# True: rebuild even if the crop files did not change since the last run
+force = False
+
+# Get all the crop files (total harvest area; not the _Irrigated/_Rainfed variants)
+crop_file = re.compile(r"^([A-Z]+)_Harvest_Area_05d\.nc$")
+all_nc_files = sorted(f for f in os.listdir(input_path) if crop_file.match(f))
+all_crops = [crop_file.match(f).group(1) for f in all_nc_files]
+input_files = [os.path.join(input_path, f) for f in all_nc_files]
 
 print(f"Found {len(all_nc_files)} crop netCDF files")
 
 # Check if main crops exist in the data
 for crop in main_crops:
-    if f"{crop}_Harvest_Area_05d.nc" not in all_nc_files:
+    if crop not in all_crops:
         print(f"Warning: Main crop {crop} not found in dataset")
 
-# Function to calculate harvest area (Harvest Area * harvest Proportion)
-def calculate_harvest_area(file_path):
-    try:
-        ds = xr.open_dataset(file_path)
-        
-        # Check if required variables exist
-        if "Harvest_Area" not in ds:
-            print(f"Error: Required variables missing in {file_path}")
-            return None
-        
-        # Calculate harvest area
-        harvest_area = ds["Harvest_Area"]
-        
-        # Replace NaN with 0 for proper summation
-        harvest_area = harvest_area.fillna(0)
-        
-        # Get lat/lon coordinates for later
-        if "lat" in ds.dims and "lon" in ds.dims:
-            lats = ds.lat.values
-            lons = ds.lon.values
-        else:
-            print(f"Warning: Expected dimensions not found in {file_path}")
-            return None
-            
-        ds.close()
-        return harvest_area, lats, lons
-        
-    except Exception as e:
-        print(f"Error processing {file_path}: {str(e)}")
-        return None
-
-# Initialize arrays to store sums
-main_crop_harvest_area = None
-all_crop_harvest_area = None
-lats = None
-lons = None
-
-# Dictionary to store individual main crop harvest areas
-main_crop_data = {}
-
-# First, process all crops to get total harvest area
-print("Calculating total harvest area for all crops...")
-for crop in all_crops:
-    file_path = os.path.join(input_path, f"{crop}_Harvest_Area_05d.nc")
-    
-    result = calculate_harvest_area(file_path)
-    if result is None:
-        continue
-        
-    harvest_area, crop_lats, crop_lons = result
-    
-    # Store coordinates from first file
-    if lats is None:
-        lats = crop_lats
-        lons = crop_lons
-    
-    # Initialize or add to the sum
-    if all_crop_harvest_area is None:
-        all_crop_harvest_area = harvest_area
-    else:
-        all_crop_harvest_area += harvest_area
-    
-    # Store individual main crop data and add to main crop sum
-    if crop in main_crops:
-        # Store the individual main crop data
-        main_crop_data[crop] = harvest_area
-        
-        # Also add to main crop sum
-        if main_crop_harvest_area is None:
-            main_crop_harvest_area = harvest_area
-        else:
-            main_crop_harvest_area += harvest_area
-        print(f"Added {crop} to main crop sum")
-
-# Check if we have valid data
-if main_crop_harvest_area is None or all_crop_harvest_area is None:
+if not any(crop in all_crops for crop in main_crops):
     print("Error: Could not calculate harvest areas")
     exit(1)
 
-# Handle missing main crops by creating zero arrays
+manifest = load_manifest(output_path)
+if not force and is_current(manifest, output_file, input_files, main_crops):
+    print(f"Up to date: {output_file}")
+    save_manifest(output_path, manifest)
+    exit(0)
+
+# All crops as one lazy (crop, lat, lon) cube; NaN counts as 0 for the sums
+print("Calculating total and main crop harvest area in one pass...")
+is_main = xr.DataArray(np.isin(all_crops, main_crops), dims="crop")
+present = [crop for crop in main_crops if crop in all_crops]
+
+with open_crop_cube(input_files, all_crops, "Harvest_Area", chunks={"lat": 90}) as ds:
+    cube = ds["Harvest_Area"].fillna(0)
+    all_crop_harvest_area, main_crop_harvest_area, main_layers = dask.compute(
+        cube.sum("crop"),
+        cube.where(is_main, 0).sum("crop"),
+        cube.sel(crop=present),
+    )
+lats = all_crop_harvest_area["lat"].values
+lons = all_crop_harvest_area["lon"].values
+
+# Individual main crops; zero arrays for missing ones
+main_crop_data = {}
 for crop in main_crops:
-    if crop not in main_crop_data:
+    if crop in present:
+        main_crop_data[crop] = main_layers.sel(crop=crop, drop=True)
+    else:
         print(f"Creating zero array for missing crop: {crop}")
         main_crop_data[crop] = xr.zeros_like(all_crop_harvest_area)
 
-# Calculate the fraction: main_crops / all_crops
+# Calculate the fraction: main_crops / all_crops (0 where there is no cropland)
 print("Calculating main crop fraction...")
-# Avoid division by zero by creating a mask
-mask = (all_crop_harvest_area > 0)
-main_crop_fraction = xr.zeros_like(all_crop_harvest_area)
-main_crop_fraction = main_crop_fraction.where(~mask, main_crop_harvest_area / all_crop_harvest_area)
+with np.errstate(invalid="ignore", divide="ignore"):
+    main_crop_fraction = (main_crop_harvest_area / all_crop_harvest_area).where(all_crop_harvest_area > 0, 0)
 
 # Create a dataset with variables for each main crop
 dataset_dict = {
@@ -165,7 +125,6 @@ for crop in main_crops:
     }
 
 # Save the result
-output_file = os.path.join(output_path, "MainCrop_Fraction_05d.nc")
 encoding = {
     "Main_Crop_harvest_Area": {"zlib": True, "complevel": 5},
     "All_Crop_harvest_Area": {"zlib": True, "complevel": 5},
@@ -177,5 +136,8 @@ for crop in main_crops:
     var_name = f"{crop}_Harvest_Area"
     encoding[var_name] = {"zlib": True, "complevel": 5}
 
-result_ds.to_netcdf(output_file, encoding=encoding)
-print(f"Saved: {output_file}")
\ No newline at end of file
+result_ds.to_netcdf(output_file + ".tmp", encoding=encoding, format="NETCDF4")
+os.replace(output_file + ".tmp", output_file)
+record(manifest, output_file, input_files, main_crops)
+save_manifest(output_path, manifest)
+print(f"Saved: {output_file}")
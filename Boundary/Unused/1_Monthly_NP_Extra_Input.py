@@ -1,4 +1,5 @@
 import os
+import sys
 import glob
 from pathlib import Path
 import numpy as np
@@ -9,6 +10,9 @@ import matplotlib.pyplot as plt
 from scipy.interpolate import griddata
 from tqdm import tqdm
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from Utils.reduce import group_reduce
+
 # ---------------- USER CONFIG ----------------
 ROOT_CSV = Path('/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs')
 ROOT_MASK = Path('/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea')
@@ -92,12 +96,11 @@ def aggregate_pixel_monthly(df):
     # compute extra demands
     df['N_extra_input_demand'] = df['N_uptake'] - df['N_decomp']
     df['P_extra_input_demand'] = df['P_uptake'] - df['P_decomp']
-    # group by lat lon month
-    grouped = df.groupby(['Lat','Lon','Month'])
-    agg = grouped.agg({
-        'N_uptake':'mean', 'N_decomp':'mean', 'P_uptake':'mean', 'P_decomp':'mean',
-        'N_deficit':'mean', 'P_deficit':'mean', 'N_extra_input_demand':'mean', 'P_extra_input_demand':'mean'
-    }).reset_index()
+    # mean per lat lon month (integer-keyed scatter-add instead of a float-keyed groupby)
+    agg = group_reduce(df, ['Lat','Lon','Month'], mean_cols=[
+        'N_uptake', 'N_decomp', 'P_uptake', 'P_decomp',
+        'N_deficit', 'P_deficit', 'N_extra_input_demand', 'P_extra_input_demand'
+    ])
     return agg
 
 
@@ -8,6 +8,7 @@
 #-----------------------------Required resources-----------------------
 #SBATCH --time=60
 #SBATCH --mem=25000
+#SBATCH --cpus-per-task=8
 
 #--------------------Environment, Operations and Job steps-------------
 source /home/WUR/zhou111/miniconda3/etc/profile.d/conda.sh
@@ -22,7 +23,8 @@ conda activate myenv
 # Step 2: Get fertilizer input after reduction [kg/ha] for rainfed and sustainable irrigated cropland
 # python /lustre/nobackup/WUR/ESG/zhou111/1_RQ1_Code/3_Results_Analysis/Fertilizer_Reduction/1_2_Get_Fert_Red.py
 
-# Step 3: Summarize the fertilizer reduction output
+# Step 3: Summarize the fertilizer reduction output (reads the scenario Zarr store, (re)built first)
+# python /lustre/nobackup/WUR/ESG/zhou111/1_RQ1_Code/3_Results_Analysis/Utils/zarr_store.py
 # python /lustre/nobackup/WUR/ESG/zhou111/1_RQ1_Code/3_Results_Analysis/Fertilizer_Reduction/2_1_Sum_sens_results.py
 
 # Step 4: Select the fertilizer reduction scenario
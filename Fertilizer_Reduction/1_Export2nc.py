@@ -1,116 +1,110 @@
 import pandas as pd
 import xarray as xr
-import numpy as np
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.cube import build_cube
+from Utils.manifest import is_current, load_manifest, record, save_manifest
 
 # study areas and crop types
 studyareas = ["Indus", "Rhine", "LaPlata", "Yangtze"]
 croptypes =  ["mainrice", "secondrice", "maize", "soybean", "winterwheat"]
 
+# Each scenario folder holds the model output CSVs and receives the .nc files next to them.
+# Every folder keeps its own export manifest, so adding a sensitivity folder only converts that folder.
+range_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
+scenario_root = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios"
+
 # Baseline:
-# csv_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_1_Baseline"
-# range_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
-# out_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_1_Baseline"
+# scenario_dirs = [f"{scenario_root}/2_1_Baseline"]
 
 # base paths: Rainfed
-# csv_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_3_Rainfed/Inc_02"
-# range_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
-# out_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_3_Rainfed/Inc_02"
+# scenario_dirs = [f"{scenario_root}/2_3_Rainfed/Inc_02"]
 
 # reduction: Irrigated
-csv_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_3_Sus_Irri_Red_Fert/Inc_02"
-range_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
-out_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_3_Sus_Irri_Red_Fert/Inc_02"
+scenario_dirs = [f"{scenario_root}/2_3_Sus_Irri_Red_Fert/Inc_02"]
 
 # reduction: Rainfed
-# csv_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_3_Rainfed/Inc_14"
-# range_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
-# out_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_3_Rainfed/Inc_14"
-
-for studyarea in studyareas:
-    # load reference grid
-    range_file = f"{range_dir}/{studyarea}/range.nc"
-    if not os.path.exists(range_file):
-        print(f"!!! range.nc missing for {studyarea}, skipping...")
-        continue
-
-    ref = xr.open_dataset(range_file)
-    lat = ref["lat"].values
-    lon = ref["lon"].values
-
-    # precompute index maps
-    lat_index = {v: i for i, v in enumerate(lat)}
-    lon_index = {v: j for j, v in enumerate(lon)}
-
-    for croptype in croptypes:
-        csv_file = f"{csv_dir}/{studyarea}_{croptype}_annual.csv"
-        output_file = f"{out_dir}/{studyarea}_{croptype}_annual.nc"
-
-        if not os.path.exists(csv_file):
-            print(f" No CSV for {studyarea} - {croptype}, skipping...")
+# scenario_dirs = [f"{scenario_root}/2_3_Rainfed/Inc_14"]
+
+# all sensitivity folders of a scenario (only new or changed outputs are converted; needs `import glob`)
+# scenario_dirs = sorted(glob.glob(f"{scenario_root}/2_3_Sus_Irri_Red_Fert/Red_*") + glob.glob(f"{scenario_root}/2_3_Sus_Irri_Red_Fert/Inc_*"))
+
+# output variable -> CSV column(s); a list of columns is summed
+output_vars = {
+    "Yield": "Storage",
+    "GrowthDay": "GrowthDay",
+    "HarvestDay": "Day",
+    "N_Uptake": "N_uptake",
+    "P_Uptake": "P_uptake",
+    "N_Runoff": ["N_surf", "N_sub"],
+    "P_Runoff": ["P_surf", "P_sub"],
+    "N_grain": "N_grain",
+    "P_grain": "P_grain",
+}
+
+# export parameters stored in the manifest; outputs are only rebuilt when these or the inputs change
+fill_value = 0.0
+export_params = {"output_vars": output_vars, "fill_value": fill_value}
+force = False  # True: reconvert everything regardless of the manifest
+
+converted, skipped = [], []
+
+for csv_dir in scenario_dirs:
+    out_dir = csv_dir
+    scenario = os.path.basename(csv_dir)
+    manifest = load_manifest(out_dir)
+
+    for studyarea in studyareas:
+        # load reference grid
+        range_file = f"{range_dir}/{studyarea}/range.nc"
+        if not os.path.exists(range_file):
+            print(f"!!! range.nc missing for {studyarea}, skipping...")
             continue
 
-        print(f"Processing {studyarea} - {croptype} ...")
-
-        # read CSV
-        df = pd.read_csv(csv_file)
-
-        years = sorted(df["Year"].unique())
-        year_index = {v: k for k, v in enumerate(years)}
-
-        # init arrays (time, lat, lon)
-        shape = (len(years), len(lat), len(lon))
-        storage_arr = np.full(shape, np.nan)
-        growthday_arr = np.full(shape, np.nan)
-        harvestday_arr = np.full(shape, np.nan)
-        nup_arr = np.full(shape, np.nan)
-        pup_arr = np.full(shape, np.nan)
-        nloss_arr = np.full(shape, np.nan)
-        ploss_arr = np.full(shape, np.nan)
-        ngrain_arr = np.full(shape, np.nan)
-        pgrain_arr = np.full(shape, np.nan)
-
-        # fill arrays
-        for _, row in df.iterrows():
-            i = lat_index.get(row["Lat"])
-            j = lon_index.get(row["Lon"])
-            t = year_index.get(row["Year"])
-            if i is not None and j is not None and t is not None:
-                storage_arr[t, i, j] = row["Storage"]
-                growthday_arr[t, i, j] = row["GrowthDay"]
-                harvestday_arr[t, i, j] = row["Day"]
-                nup_arr[t, i, j] = row["N_uptake"]
-                pup_arr[t, i, j] = row["P_uptake"]
-                nloss_arr[t, i, j] = row["N_surf"] + row["N_sub"] 
-                ploss_arr[t, i, j] = row["P_surf"] + row["P_sub"] 
-                ngrain_arr[t, i, j] = row["N_grain"]
-                pgrain_arr[t, i, j] = row["P_grain"]
-
-        # make Dataset
-        ds = xr.Dataset(
-            {
-                "Yield": (("year", "lat", "lon"), storage_arr),
-                "GrowthDay": (("year", "lat", "lon"), growthday_arr),
-                "HarvestDay": (("year", "lat", "lon"), harvestday_arr),
-                "N_Uptake": (("year", "lat", "lon"), nup_arr),
-                "P_Uptake": (("year", "lat", "lon"), pup_arr),
-                "N_Runoff": (("year", "lat", "lon"), nloss_arr),
-                "P_Runoff": (("year", "lat", "lon"), ploss_arr),
-                "N_grain": (("year", "lat", "lon"), ngrain_arr),
-                "P_grain": (("year", "lat", "lon"), pgrain_arr),
-
-            },
-            coords={"year": years, "lat": lat, "lon": lon}
-        )
-
-        # attributes
-        ds.attrs["description"] = f"Annual yield for {croptype} in {studyarea}"
-        for var in ds.data_vars:
-            ds[var].attrs["_FillValue"] = 0.0
-
-        # replace NaN with FillValue
-        ds = ds.fillna(0.0)
-
-        # save
-        ds.to_netcdf(output_file)
-        print(f" Saved {output_file}")
+        ref = xr.open_dataset(range_file)
+        lat = ref["lat"].values
+        lon = ref["lon"].values
+
+        for croptype in croptypes:
+            csv_file = f"{csv_dir}/{studyarea}_{croptype}_annual.csv"
+            output_file = f"{out_dir}/{studyarea}_{croptype}_annual.nc"
+
+            if not os.path.exists(csv_file):
+                print(f" No CSV for {studyarea} - {croptype}, skipping...")
+                continue
+
+            inputs = [csv_file, range_file]
+            if not force and is_current(manifest, output_file, inputs, export_params):
+                skipped.append(f"{scenario}/{studyarea}_{croptype}")
+                continue
+
+            print(f"Processing {scenario}: {studyarea} - {croptype} ...")
+
+            # read CSV
+            df = pd.read_csv(csv_file)
+
+            # scatter all variables onto the (year, lat, lon) grid
+            ds = build_cube(df, output_vars, lat, lon)
+
+            # attributes
+            ds.attrs["description"] = f"Annual yield for {croptype} in {studyarea}"
+            for var in ds.data_vars:
+                ds[var].attrs["_FillValue"] = fill_value
+
+            # replace NaN with FillValue
+            ds = ds.fillna(fill_value)
+
+            # save
+            ds.to_netcdf(output_file)
+            print(f" Saved {output_file}")
+
+            record(manifest, output_file, inputs, export_params)
+            save_manifest(out_dir, manifest)
+            converted.append(f"{scenario}/{studyarea}_{croptype}")
+
+    # keeps refreshed mtimes of touched but unchanged inputs
+    save_manifest(out_dir, manifest)
+
+print(f"Converted {len(converted)}, skipped {len(skipped)} unchanged: {', '.join(skipped) or '-'}")
@@ -2,8 +2,12 @@
 
 import numpy as np
 import os
+import sys
 import xarray as xr
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.zarr_store import open_scenarios
+
 Basins = ["Indus", "Rhine", "LaPlata", "Yangtze"]
 CropTypes = ["mainrice", "secondrice", "maize", "winterwheat", "soybean"]
 red_scenarios = ["Red_02", "Red_04", "Red_06", "Red_08", "Red_10", "Red_12", "Red_14"]
@@ -13,12 +17,17 @@ end_year = 2019
 Data_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
 crit_loss_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/2_Critical_NP_losses/Method3"
 
-# model output directory for rainfed field 
-model_output_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_3_Rainfed"
+# Annual model outputs of all scenarios, in one Zarr store (built by Utils/zarr_store.py) from the
+# NetCDFs below scenario_root; runs newer than the store are read from their NetCDF
+scenario_root = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios"
+store_path = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/RQ1_Scenarios.zarr"
+
+# model output scenarios for rainfed field
+model_output_group = "2_3_Rainfed"
 output_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/4_Fertilization_Red/4_1_Reduced_Fert/Rainfed/Sens_Analysis"
 
 # model output directory for irrigated field
-# model_output_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_3_Sus_Irri_Red_Fert"
+# model_output_group = "2_3_Sus_Irri_Red_Fert"
 # output_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/4_Fertilization_Red/4_1_Reduced_Fert/Irrigated/Sens_Analysis"
 
 for basin in Basins:
@@ -75,44 +84,20 @@ for basin in Basins:
         Crit_P_Runoff = ds_crit_P_loss["Critical_P_runoff"].where(Basin_mask>2500)
 
         # ================ Find the suitable fertilizer reduction scenario =================
-        Yield_list = []
-        N_exc_list = []
-        P_exc_list = []
-        scenario_names = []
-
-        for scenario in red_scenarios:
-
-            results_dir = os.path.join(model_output_dir, scenario)
-            result_file = os.path.join(results_dir, f"{basin}_{crop}_annual.nc")
-
-            if not os.path.exists(result_file):
-                print(f"Missing {crop} for basin {basin} in scenario {scenario}")
-                continue
-
-            ds_fert = xr.open_dataset(result_file)
-
-            Yield = ds_fert["Yield"].sel(year=slice(start_year, end_year))
-            Avg_Yield = Yield.mean(dim="year", skipna=True).where(Basin_mask > 2500)
-
-            N_Runoff = (ds_fert["N_Runoff"].sel(year=slice(start_year, end_year)).mean(dim="year", skipna=True).where(Basin_mask > 2500))
-            P_Runoff = (ds_fert["P_Runoff"].sel(year=slice(start_year, end_year)).mean(dim="year", skipna=True).where(Basin_mask > 2500))
-
-            N_Exceedance = (N_Runoff - Crit_N_Runoff).rename("N_exceedance")
-            P_Exceedance = (P_Runoff - Crit_P_Runoff).rename("P_exceedance")
-
-            # add scenario dimension
-            Avg_Yield = Avg_Yield.expand_dims(scenario=[scenario])
-            N_Exceedance = N_Exceedance.expand_dims(scenario=[scenario])
-            P_Exceedance = P_Exceedance.expand_dims(scenario=[scenario])
+        ds_fert = open_scenarios(store_path, basin, crop,
+                                 scenarios=[f"{model_output_group}/{scenario}" for scenario in red_scenarios],
+                                 variables=["Yield", "N_Runoff", "P_Runoff"], source_root=scenario_root)
+        if ds_fert is None:
+            print(f"Missing {crop} for basin {basin} in all scenarios")
+            continue
+        ds_fert = ds_fert.assign_coords(scenario=[s.rsplit("/", 1)[-1] for s in ds_fert["scenario"].values])
 
-            Yield_list.append(Avg_Yield)
-            N_exc_list.append(N_Exceedance)
-            P_exc_list.append(P_Exceedance)
-            scenario_names.append(scenario)
+        # all scenarios at once, read from the store in one pass
+        Avg = ds_fert.sel(year=slice(start_year, end_year)).mean(dim="year", skipna=True).where(Basin_mask > 2500).compute()
 
-        Yield_all = xr.concat(Yield_list, dim="scenario")
-        N_Exceedance_all = xr.concat(N_exc_list, dim="scenario")
-        P_Exceedance_all = xr.concat(P_exc_list, dim="scenario")
+        Yield_all = Avg["Yield"]
+        N_Exceedance_all = (Avg["N_Runoff"] - Crit_N_Runoff).rename("N_exceedance")
+        P_Exceedance_all = (Avg["P_Runoff"] - Crit_P_Runoff).rename("P_exceedance")
 
         output_Yield_file = os.path.join(output_dir, f"{basin}_{crop}_Yields.nc")
         output_N_Exceedance_file = os.path.join(output_dir, f"{basin}_{crop}_N_Exceedance.nc")
@@ -2,6 +2,10 @@ import pandas as pd
 import xarray as xr
 import numpy as np
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.manifest import is_current, load_manifest, record, save_manifest
 
 # study areas and crop types
 studyareas = ["Indus"] # ["Indus", "Rhine", "LaPlata", "Yangtze"]
@@ -12,6 +16,14 @@ csv_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/S0"
 range_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
 out_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/S0"
 
+# export parameters stored in the manifest; outputs are only rebuilt when these or the inputs change
+fill_value = 0.0
+export_params = {"select": "max Avg", "fill_value": fill_value}
+force = False  # True: reconvert everything regardless of the manifest
+
+manifest = load_manifest(out_dir)
+converted, skipped = [], []
+
 for studyarea in studyareas:
     # load reference grid for this study area
     range_file = f"{range_dir}/{studyarea}/range.nc"
@@ -35,6 +47,11 @@ for studyarea in studyareas:
             print(f" No CSV for {studyarea} - {croptype}, skipping...")
             continue
 
+        inputs = [csv_file, range_file]
+        if not force and is_current(manifest, output_file, inputs, export_params):
+            skipped.append(f"{studyarea}_{croptype}")
+            continue
+
         print(f"Processing {studyarea} - {croptype} ...")
 
         # read CSV
@@ -77,11 +94,19 @@ for studyarea in studyareas:
         # attributes
         ds.attrs["description"] = f"Best parameters for {croptype} in {studyarea} (max Avg)"
         for var in ds.data_vars:
-            ds[var].attrs["_FillValue"] = 0.0
+            ds[var].attrs["_FillValue"] = fill_value
 
         # replace NaN with FillValue
-        ds = ds.fillna(0.0)
+        ds = ds.fillna(fill_value)
 
         # save
         ds.to_netcdf(output_file)
         print(f" Saved {output_file}")
+
+        record(manifest, output_file, inputs, export_params)
+        save_manifest(out_dir, manifest)
+        converted.append(f"{studyarea}_{croptype}")
+
+# keeps refreshed mtimes of touched but unchanged inputs
+save_manifest(out_dir, manifest)
+print(f"Converted {len(converted)}, skipped {len(skipped)} unchanged: {', '.join(skipped) or '-'}")
@@ -1,7 +1,11 @@
 import pandas as pd
 import xarray as xr
-import numpy as np
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.cube import build_cube
+from Utils.manifest import is_current, load_manifest, record, save_manifest
 
 # study areas and crop types
 studyareas = ["Indus", "Rhine", "LaPlata", "Yangtze"]
@@ -12,6 +16,25 @@ csv_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_1_
 range_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
 out_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_1_Baseline"
 
+# output variable -> CSV column(s); a list of columns is summed
+output_vars = {
+    "Yield": "Storage",
+    "GrowthDay": "GrowthDay",
+    "HarvestDay": "Day",
+    "N_Uptake": "N_uptake",
+    "P_Uptake": "P_uptake",
+    "N_Runoff": ["N_surf", "N_sub"],
+    "P_Runoff": ["P_surf", "P_sub"],
+}
+
+# export parameters stored in the manifest; outputs are only rebuilt when these or the inputs change
+fill_value = 0.0
+export_params = {"output_vars": output_vars, "fill_value": fill_value}
+force = False  # True: reconvert everything regardless of the manifest
+
+manifest = load_manifest(out_dir)
+converted, skipped = [], []
+
 for studyarea in studyareas:
     # load reference grid
     range_file = f"{range_dir}/{studyarea}/range.nc"
@@ -23,10 +46,6 @@ for studyarea in studyareas:
     lat = ref["lat"].values
     lon = ref["lon"].values
 
-    # precompute index maps
-    lat_index = {v: i for i, v in enumerate(lat)}
-    lon_index = {v: j for j, v in enumerate(lon)}
-
     for croptype in croptypes:
         csv_file = f"{csv_dir}/{studyarea}_{croptype}_annual.csv"
         output_file = f"{out_dir}/{studyarea}_{croptype}_annual.nc"
@@ -35,60 +54,35 @@ for studyarea in studyareas:
             print(f" No CSV for {studyarea} - {croptype}, skipping...")
             continue
 
+        inputs = [csv_file, range_file]
+        if not force and is_current(manifest, output_file, inputs, export_params):
+            skipped.append(f"{studyarea}_{croptype}")
+            continue
+
         print(f"Processing {studyarea} - {croptype} ...")
 
         # read CSV
         df = pd.read_csv(csv_file)
 
-        years = sorted(df["Year"].unique())
-        year_index = {v: k for k, v in enumerate(years)}
-
-        # init arrays (time, lat, lon)
-        shape = (len(years), len(lat), len(lon))
-        storage_arr = np.full(shape, np.nan)
-        growthday_arr = np.full(shape, np.nan)
-        harvestday_arr = np.full(shape, np.nan)
-        nup_arr = np.full(shape, np.nan)
-        pup_arr = np.full(shape, np.nan)
-        nloss_arr = np.full(shape, np.nan)
-        ploss_arr = np.full(shape, np.nan)
-
-        # fill arrays
-        for _, row in df.iterrows():
-            i = lat_index.get(row["Lat"])
-            j = lon_index.get(row["Lon"])
-            t = year_index.get(row["Year"])
-            if i is not None and j is not None and t is not None:
-                storage_arr[t, i, j] = row["Storage"]
-                growthday_arr[t, i, j] = row["GrowthDay"]
-                harvestday_arr[t, i, j] = row["Day"]
-                nup_arr[t, i, j] = row["N_uptake"]
-                pup_arr[t, i, j] = row["P_uptake"]
-                nloss_arr[t, i, j] = row["N_surf"] + row["N_sub"] 
-                ploss_arr[t, i, j] = row["P_surf"] + row["P_sub"] 
-
-        # make Dataset
-        ds = xr.Dataset(
-            {
-                "Yield": (("year", "lat", "lon"), storage_arr),
-                "GrowthDay": (("year", "lat", "lon"), growthday_arr),
-                "HarvestDay": (("year", "lat", "lon"), harvestday_arr),
-                "N_Uptake": (("year", "lat", "lon"), nup_arr),
-                "P_Uptake": (("year", "lat", "lon"), pup_arr),
-                "N_Runoff": (("year", "lat", "lon"), nloss_arr),
-                "P_Runoff": (("year", "lat", "lon"), ploss_arr),
-            },
-            coords={"year": years, "lat": lat, "lon": lon}
-        )
+        # scatter all variables onto the (year, lat, lon) grid
+        ds = build_cube(df, output_vars, lat, lon)
 
         # attributes
         ds.attrs["description"] = f"Annual yield for {croptype} in {studyarea}"
         for var in ds.data_vars:
-            ds[var].attrs["_FillValue"] = 0.0
+            ds[var].attrs["_FillValue"] = fill_value
 
         # replace NaN with FillValue
-        ds = ds.fillna(0.0)
+        ds = ds.fillna(fill_value)
 
         # save
         ds.to_netcdf(output_file)
         print(f" Saved {output_file}")
+
+        record(manifest, output_file, inputs, export_params)
+        save_manifest(out_dir, manifest)
+        converted.append(f"{studyarea}_{croptype}")
+
+# keeps refreshed mtimes of touched but unchanged inputs
+save_manifest(out_dir, manifest)
+print(f"Converted {len(converted)}, skipped {len(skipped)} unchanged: {', '.join(skipped) or '-'}")
@@ -1,8 +1,11 @@
 import os 
-import pandas as pd
 import geopandas as gpd
 import xarray as xr
 import matplotlib.pyplot as plt
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.parquet_store import load_output
 
 # Input/output directories
 csv_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Water-Nutrient-Limited"
@@ -32,16 +35,8 @@ for basin in studyareas:
 
         print(f"Processing {basin} - {crop}")
 
-        # Read csv
-        df = pd.read_csv(csv_file, delimiter=",", skipinitialspace=True)
-
-        # Convert variables to numeric
-        for col in p_vars:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors="coerce")
-
-        # Filter years
-        df = df[(df["Year"] >= 1986) & (df["Year"] <= 2015)]
+        # Read csv (1986-2015 only)
+        df = load_output(csv_file, "annual", columns=["Lat", "Lon"] + p_vars, years=(1986, 2015))
 
         # Drop rows with NaN
         df = df.dropna(subset=p_vars)
@@ -1,7 +1,11 @@
 import os
-import pandas as pd
 import xarray as xr
 import matplotlib.pyplot as plt
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.parquet_store import load_output
+from Utils.zonal import pixel_index, zonal_stats
 
 # Input/output directories
 csv_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Output_Unsus_Irrigation"
@@ -29,12 +33,8 @@ for basin in studyareas:
         print(f"Processing {basin} - {crop}")
 
         # Read CSV
-        df = pd.read_csv(csv_file, delimiter=",", skipinitialspace=True)
-
-        # Ensure numeric
-        for col in inputs + gaseous + water + uptake:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors="coerce")
+        df = load_output(csv_file, "annual", columns=["Lat", "Lon"] + inputs + gaseous + water + uptake,
+                         years=(1986, 2015))
 
         # >>> Recalculate N_fert here <<<
         df["N_fert"] = (
@@ -45,8 +45,6 @@ for basin in studyareas:
             + df.get("NOx", 0)
         )
 
-        # Filter years
-        df = df[(df["Year"] >= 1986) & (df["Year"] <= 2015)]
         df = df.dropna(subset=inputs + gaseous + water + uptake)
         if df.empty:
             continue
@@ -54,31 +52,22 @@ for basin in studyareas:
         # Average across years per pixel
         avg_df = df.groupby(["Lat", "Lon"])[inputs + gaseous + water + uptake].mean().reset_index()
 
-        # Load mask
-        mask = xr.open_dataset(mask_file)
-        ha = mask["HA"].load()
-
-        ha_df = ha.to_dataframe().reset_index()
-        ha_valid = ha_df[~ha_df["HA"].isna()][["lat", "lon", "HA"]]
+        # Cropland pixels (HA > 0) of the mask
+        with xr.open_dataset(mask_file) as mask:
+            index = pixel_index(mask["HA"].load())
 
-        # Merge HA with avg_df
-        merged = avg_df.merge(
-            ha_valid, left_on=["Lat", "Lon"], right_on=["lat", "lon"], how="inner")
-            
-        if merged.empty:
+        # Area-weighted averages and totals of all variables at once
+        means, totals = zonal_stats(avg_df, index, inputs + gaseous + water + uptake)
+        if means.isna().all():
             continue
 
-        # Compute weighted averages
-        total_ha = merged["HA"].sum()
         weighted = {}
         for group, cols in [
             ("Inputs", inputs),
             ("Uptake & losses", gaseous + water + uptake)
         ]:
-            weighted[group] = {}
-            for col in cols:
-                weighted[group][col] = (merged[col] * merged["HA"]).sum() / total_ha
-                # weighted[group][col] = (merged[col] * merged["HA"]).sum()
+            weighted[group] = means[cols].to_dict()
+            # weighted[group] = totals[cols].to_dict()
         # Colors
         colors = {
             # Inputs
@@ -1,7 +1,11 @@
 import os 
-import pandas as pd
 import xarray as xr
 import matplotlib.pyplot as plt
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.parquet_store import load_output
+from Utils.zonal import pixel_index, zonal_stats
 
 # Input/output directories
 csv_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Output"
@@ -28,15 +32,7 @@ for basin in studyareas:
         print(f"Processing {basin} - {crop}")
  
         # Read CSV
-        df = pd.read_csv(csv_file, delimiter=",", skipinitialspace=True)
-
-        # Convert P variables to numeric
-        for col in p_vars:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors="coerce")
-
-        # Filter years
-        df = df[(df["Year"] >= 1986) & (df["Year"] <= 2015)]
+        df = load_output(csv_file, "annual", columns=["Lat", "Lon"] + p_vars, years=(1986, 2015))
         df = df.dropna(subset=p_vars)
         if df.empty:
             continue
@@ -44,26 +40,19 @@ for basin in studyareas:
         # Average across years per pixel
         avg_df = df.groupby(["Lat", "Lon"])[p_vars].mean().reset_index()
 
-        # Load mask
-        mask = xr.open_dataset(mask_file)
-        ha = mask["HA"].load()
-        ha_df = ha.to_dataframe().reset_index()
-        ha_valid = ha_df[~ha_df["HA"].isna()][["lat", "lon", "HA"]]
-
-        # Merge with avg_df
-        merged = avg_df.merge(
-            ha_valid, left_on=["Lat", "Lon"], right_on=["lat", "lon"], how="inner"
-        )
-        if merged.empty:
+        # Cropland pixels (HA > 0) of the mask
+        with xr.open_dataset(mask_file) as mask:
+            index = pixel_index(mask["HA"].load())
+
+        # Area-weighted averages and totals of all variables at once
+        means, totals = zonal_stats(avg_df, index, p_vars)
+        if means.isna().all():
             continue
 
-        # Compute area-weighted averages
-        total_ha = merged["HA"].sum()
         weighted = {}
         for group, cols in [("Inputs", p_inputs), ("Uptake, losses & accumulation", p_outputs)]:
-            weighted[group] = {}
-            for col in cols:
-                weighted[group][col] = (merged[col] * merged["HA"]).sum() / total_ha
+            weighted[group] = means[cols].to_dict()
+            # weighted[group] = totals[cols].to_dict()
 
         # 🔹 Print values
         print(f"\nArea-weighted averages for {basin} - {crop} (1986–2015):")
@@ -1,93 +1,88 @@
 import os
+import numpy as np
 import pandas as pd
 import xarray as xr
 import matplotlib.pyplot as plt
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.parquet_store import load_output
+from Utils.parallel import run_basin_crop
+from Utils.zonal import pixel_index, pool_trajectory
 
 csv_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_1_Baseline"
 mask_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
 out_dir = "/lustre/nobackup/WUR/ESG/zhou111/4_RQ1_Analysis_Results/Warm_Up_test"
 
 studyareas = ["LaPlata", "Yangtze", "Indus", "Rhine"]
-crops = ["winterwheat"] # ["mainrice", "secondrice", "winterwheat", "soybean", "maize"]
+crops = ["mainrice", "secondrice", "winterwheat", "soybean", "maize"]
 
-for basin in studyareas:
-    for crop in crops:
-        mask_crop = "winterwheat" if crop == "wheat" else crop
+# Peak memory [MB] of one basin-crop task; sizes the process pool
+task_memory_mb = 2000
 
-        csv_file = os.path.join(csv_dir, f"{basin}_{crop}_annual.csv")
-        mask_file = os.path.join(mask_dir, basin, "Mask", f"{basin}_{mask_crop}_mask.nc")
-        if not os.path.exists(csv_file) or not os.path.exists(mask_file):
-            continue
 
-        print(f"Processing {basin} - {crop}")
+def process(basin, crop):
+    mask_crop = "winterwheat" if crop == "wheat" else crop
 
-        # Load CSV
-        df = pd.read_csv(csv_file, delimiter=",", skipinitialspace=True)
-        vars_pool = ["LabileP", "StableP"]
-        vars_flux = ["P_decomp", "P_fert"]
+    csv_file = os.path.join(csv_dir, f"{basin}_{crop}_annual.csv")
+    mask_file = os.path.join(mask_dir, basin, "Mask", f"{basin}_{mask_crop}_mask.nc")
+    if not os.path.exists(csv_file) or not os.path.exists(mask_file):
+        return None
 
-        for col in vars_pool + vars_flux:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors="coerce")
+    print(f"Processing {basin} - {crop}")
 
-        # Keep 1986–2015
-        df = df[(df["Year"] >= 2006) & (df["Year"] <= 2019)]
+    # Load CSV (2006-2019 only)
+    vars_pool = ["LabileP", "StableP"]
+    vars_flux = ["P_decomp", "P_fert"]
+    df = load_output(csv_file, "annual", columns=["Lat", "Lon", "Year"] + vars_pool + vars_flux, years=(2006, 2019))
 
-        # Load mask
-        mask = xr.open_dataset(mask_file)
+    # Cropland pixels with HA and bulk density
+    with xr.open_dataset(mask_file) as mask:
         ha = mask["HA"].load()   # ha per pixel
         bd = mask["bulk_density"].load()  # kg/dm³ per pixel
+    index = pixel_index(ha, threshold=-np.inf, valid=bd.notnull())  # every pixel with HA and BD
 
-        # Merge HA & BD with df
-        mask_df = xr.merge([ha, bd]).to_dataframe().reset_index()
-        mask_df = mask_df.dropna(subset=["HA", "bulk_density"])
-
-        merged = df.merge(mask_df, left_on=["Lat","Lon"], right_on=["lat","lon"], how="inner")
-
-        if merged.empty:
-            continue
-
-        results = []
-        for year, g in merged.groupby("Year"):
-            # Pools: area‐weighted with HA*BD
-            pool_den = (g["HA"] * g["bulk_density"]).sum()
-            labile_avg = (g["LabileP"] * g["HA"] * g["bulk_density"]).sum() / pool_den
-            stable_avg = (g["StableP"] * g["HA"] * g["bulk_density"]).sum() / pool_den
-
-            # Fluxes: area‐weighted with HA
-            ha_tot = g["HA"].sum()
-            p_decomp_avg = (g["P_decomp"] * g["HA"]).sum() / ha_tot
-            p_fert_avg = (g["P_fert"] * g["HA"]).sum() / ha_tot
+    # Pools: area‐weighted with HA*BD; fluxes: area‐weighted with HA (all years at once)
+    ts = pool_trajectory(df, index, bd, vars_pool, vars_flux)
+    if ts.empty:
+        return None
 
-            results.append([year, labile_avg, stable_avg, p_decomp_avg, p_fert_avg])
 
-        ts = pd.DataFrame(results, columns=["Year","LabileP","StableP","P_decomp","P_fert"])
+    # ---- Plot ----
+    fig, ax1 = plt.subplots(figsize=(9,6))
 
+    # Pools (greens)
+    ax1.plot(ts["Year"], ts["LabileP"], label="LabileP", color="#23bb97", lw=2)
+    ax1.plot(ts["Year"], ts["StableP"], label="StableP", color="#1A8361", lw=2)
+    ax1.set_ylabel("Soil P pools (mmol/kg)")
+    ax1.set_xlabel("Year")
 
-        # ---- Plot ----
-        fig, ax1 = plt.subplots(figsize=(9,6))
+    # Inputs (reds)
+    ax2 = ax1.twinx()
+    ax2.plot(ts["Year"], ts["P_decomp"], label="P_decomp", color="#e7b41c", lw=2, ls="--")
+    ax2.plot(ts["Year"], ts["P_fert"], label="P_fert", color="#f15627", lw=2, ls="--")
+    ax2.set_ylabel("P inputs (kg/ha/yr)")
 
-        # Pools (greens)
-        ax1.plot(ts["Year"], ts["LabileP"], label="LabileP", color="#23bb97", lw=2)
-        ax1.plot(ts["Year"], ts["StableP"], label="StableP", color="#1A8361", lw=2)
-        ax1.set_ylabel("Soil P pools (mmol/kg)")
-        ax1.set_xlabel("Year")
+    # Combine legends
+    lines1, labels1 = ax1.get_legend_handles_labels()
+    lines2, labels2 = ax2.get_legend_handles_labels()
+    ax1.legend(lines1+lines2, labels1+labels2, bbox_to_anchor=(1.05,1), loc="upper left")
 
-        # Inputs (reds)
-        ax2 = ax1.twinx()
-        ax2.plot(ts["Year"], ts["P_decomp"], label="P_decomp", color="#e7b41c", lw=2, ls="--")
-        ax2.plot(ts["Year"], ts["P_fert"], label="P_fert", color="#f15627", lw=2, ls="--")
-        ax2.set_ylabel("P inputs (kg/ha/yr)")
+    plt.title(f"{basin} - {crop} Basin Average (1986–2015)", y=1.02)
+    plt.tight_layout()
 
-        # Combine legends
-        lines1, labels1 = ax1.get_legend_handles_labels()
-        lines2, labels2 = ax2.get_legend_handles_labels()
-        ax1.legend(lines1+lines2, labels1+labels2, bbox_to_anchor=(1.05,1), loc="upper left")
+    out_file = os.path.join(out_dir, f"{basin}_{crop}_Plines_pools_fert_Annual.png")
+    plt.savefig(out_file, dpi=300, bbox_inches="tight")
+    plt.close()
 
-        plt.title(f"{basin} - {crop} Basin Average (1986–2015)", y=1.02)
-        plt.tight_layout()
+    return ts.assign(Basin=basin, Crop=crop)
 
-        out_file = os.path.join(out_dir, f"{basin}_{crop}_Plines_pools_fert_Annual.png")
-        plt.savefig(out_file, dpi=300, bbox_inches="tight")
-        plt.close()
 
+if __name__ == "__main__":
+    # Trajectories of all basin-crops in one run, also written to one table
+    results = run_basin_crop(process, studyareas, crops, task_memory_mb=task_memory_mb)
+    trajectories = [ts for _, ts, _ in results if ts is not None]
+    if trajectories:
+        out_file = os.path.join(out_dir, "Plines_pools_fert_Annual.csv")
+        pd.concat(trajectories, ignore_index=True).to_csv(out_file, index=False)
+        print(f"Saved trajectories -> {out_file}")
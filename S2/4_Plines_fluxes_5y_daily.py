@@ -1,12 +1,21 @@
 import os
-import pandas as pd
+import sys
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.dates import date_of
+from Utils.parquet_store import read_pixels
+from Utils.stages import demand_cutoff
+
 # Input/output directories
 indir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Test_Decomp_off"
 outdir = "/lustre/nobackup/WUR/ESG/zhou111/4_RQ1_Analysis_Results/Test_Decomp_off"
 os.makedirs(outdir, exist_ok=True)
 
+# Pixel-sorted daily outputs, built from the CSVs in indir by Utils/parquet_store.py
+# (read from the CSVs themselves while that copy is missing or older than them)
+parquet_root = os.path.join(indir, "Parquet")
+
 # Define target points for each basin/crop
 targets = {
     "Indus": {
@@ -40,22 +49,18 @@ for basin, crops in targets.items():
             print(f"⚠️ File not found: {infile}")
             continue
 
-        # Load data
-        df = pd.read_csv(infile)
-
-        # Select the grid cell (exact lat/lon match assumed)
-        df_sel = df[(df["Lat"] == lat) & (df["Lon"] == lon)]
-        df_sel = df_sel[(df_sel["Year"] >= 1989) & (df_sel["Year"] <= 1990)]
+        # Load only the grid cell (exact lat/lon match assumed)
+        df_sel = read_pixels(parquet_root, basin, crop, [(lat, lon)], years=(1989, 1990))
 
         if df_sel.empty:
             print(f"⚠️ No data found for {basin} {crop} at ({lat},{lon})")
             continue
 
         # Construct a daily datetime index
-        df_sel["Date"] = pd.to_datetime(df_sel["Year"].astype(str), format="%Y") + pd.to_timedelta(df_sel["Day"] - 1, unit="D")
+        df_sel["Date"] = date_of(df_sel["Year"], df_sel["Day"])
 
         # Apply condition for P_demand (set to 0 outside dev stage range)
-        df_sel["P_demand_cond"] = df_sel.apply(lambda r: r["P_demand"] if 0.0 <= r["Dev_Stage"] <= 1.3 else 0, axis=1)
+        df_sel["P_demand_cond"] = df_sel["P_demand"].where(df_sel["Dev_Stage"].between(0.0, demand_cutoff(crop)), 0)
 
         # === Plot ===
         fig, axes = plt.subplots(3, 1, figsize=(12, 10), sharex=True)
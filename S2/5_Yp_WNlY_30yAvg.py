@@ -7,6 +7,11 @@ import geopandas as gpd
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 from mpl_toolkits.axes_grid1 import make_axes_locatable
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.parquet_store import load_output
 
 # -------------------------
 # Config
@@ -83,12 +88,8 @@ for crop in crops:
     # --- Read CSVs ---
     f1 = f"{dir_S1}/{studyarea}_{mask_crop}_annual.csv"
     f2 = f"{dir_S2}/{studyarea}_{crop}_annual.csv"
-    df1 = pd.read_csv(f1)
-    df2 = pd.read_csv(f2)
-
-    # Filter years
-    df1 = df1[(df1["Year"]>=1986) & (df1["Year"]<=2015)]
-    df2 = df2[(df2["Year"]>=1986) & (df2["Year"]<=2015)]
+    df1 = load_output(f1, "annual", columns=["Lat", "Lon", "Storage"], years=(1986, 2015))
+    df2 = load_output(f2, "annual", columns=["Lat", "Lon", "Storage"], years=(1986, 2015))
 
     # Average Storage
     df1_mean = df1.groupby(["Lat","Lon"])["Storage"].mean().reset_index()
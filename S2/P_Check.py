@@ -1,12 +1,21 @@
 import os
-import pandas as pd
+import sys
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.dates import date_of
+from Utils.parquet_store import read_pixels
+from Utils.stages import demand_cutoff
+
 # Paths
 input_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Test_Decomp_off"
 output_dir = "/lustre/nobackup/WUR/ESG/zhou111/4_RQ1_Analysis_Results/0_NP_Demand/S1_WL"
 os.makedirs(output_dir, exist_ok=True)
 
+# Pixel-sorted daily outputs, built from the CSVs in input_dir by Utils/parquet_store.py
+# (read from the CSVs themselves while that copy is missing or older than them)
+parquet_root = os.path.join(input_dir, "Parquet")
+
 # Target points
 targets = {
      "Indus": {
@@ -36,43 +45,26 @@ targets = {
 # Years of interest
 start_year, end_year = 1996, 2015
 
-# Crop-specific Dev_Stage cutoffs
-stage_cutoffs = {"soybean": 1.5}
-default_cutoff = 1.3
-
 for studyarea, crops in targets.items():
     for crop, (lat, lon) in crops.items():
-        filename = f"{studyarea}_{crop}_daily.csv"
-        filepath = os.path.join(input_dir, filename)
+        filepath = os.path.join(input_dir, f"{studyarea}_{crop}_daily.csv")
         if not os.path.exists(filepath):
             print(f"⚠️ Missing file: {filepath}")
             continue
 
-        # Load data
-        df = pd.read_csv(filepath)
-
-        # Extract the point
-        point_df = df[(df["Lat"] == lat) & (df["Lon"] == lon)]
+        # Load only the point, restricted to years
+        point_df = read_pixels(parquet_root, studyarea, crop, [(lat, lon)], years=(start_year, end_year))
         if point_df.empty:
             print(f"⚠️ No data for {studyarea} {crop} at ({lat}, {lon})")
             continue
 
-        # Restrict to years
-        point_df = point_df[(point_df["Year"] >= start_year) & (point_df["Year"] <= end_year)]
-
         # Make a datetime index
-        point_df["Date"] = pd.to_datetime(point_df["Year"].astype(str), format="%Y") + \
-                           pd.to_timedelta(point_df["Day"] - 1, unit="D")
+        point_df["Date"] = date_of(point_df["Year"], point_df["Day"])
 
         # --- Data conditioning ---
-        cutoff = stage_cutoffs.get(crop, default_cutoff)
-        point_df["P_demand_cond"] = point_df["P_demand"].where(
-            (point_df["Dev_Stage"] >= 0.0) & (point_df["Dev_Stage"] <= cutoff), 0
-        )
-
-        point_df["N_demand_cond"] = point_df["N_demand"].where(
-            (point_df["Dev_Stage"] >= 0.0) & (point_df["Dev_Stage"] <= cutoff), 0
-        )
+        demand_stage = point_df["Dev_Stage"].between(0.0, demand_cutoff(crop))
+        point_df["P_demand_cond"] = point_df["P_demand"].where(demand_stage, 0)
+        point_df["N_demand_cond"] = point_df["N_demand"].where(demand_stage, 0)
 
         point_df["RootDepth_cond"] = point_df["RootDepth"].where(
             (point_df["Transpiration"] > 0.0), 0
@@ -8,6 +8,7 @@
 #-----------------------------Required resources-----------------------
 #SBATCH --time=600
 #SBATCH --mem=250000
+#SBATCH --cpus-per-task=8
 
 #--------------------Environment, Operations and Job steps-------------
 source /home/WUR/zhou111/miniconda3/etc/profile.d/conda.sh
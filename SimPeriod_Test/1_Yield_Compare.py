@@ -1,4 +1,3 @@
-import pandas as pd
 import numpy as np
 import xarray as xr
 import matplotlib.pyplot as plt
@@ -7,6 +6,12 @@ import geopandas as gpd
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 from mpl_toolkits.axes_grid1 import make_axes_locatable
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.climatology import table_climatology, window_mean
+from Utils.schema import read_table
 
 # -------------------------
 # Config
@@ -59,43 +64,27 @@ for crop in crops:
     # --- Read CSVs ---
     f1 = f"{output_dir}/{studyarea}_Yp_{crop}_Annual.csv"
     f2 = f"{output_dir}/{studyarea}_wl_noIrri_{crop}_Annual.csv"
-    df1 = pd.read_csv(f1)
-    df2 = pd.read_csv(f2)
-
-    # Filter years
-    df1_30y = df1[(df1["Year"]>=1990) & (df1["Year"]<=2019)]
-    df1_10y = df1[(df1["Year"]>=2010) & (df1["Year"]<=2019)]  
-    df2_30y = df2[(df2["Year"]>=1990) & (df2["Year"]<=2019)]
-    df2_10y = df2[(df2["Year"]>=2010) & (df2["Year"]<=2019)] 
-
-    # Average Storage
-    df1_30y_mean = df1_30y.groupby(["Lat","Lon"])["Storage"].mean().reset_index()
-    df1_10y_mean = df1_10y.groupby(["Lat","Lon"])["Storage"].mean().reset_index()
-
-    df2_30y_mean = df2_30y.groupby(["Lat","Lon"])["Storage"].mean().reset_index()
-    df2_10y_mean = df2_10y.groupby(["Lat","Lon"])["Storage"].mean().reset_index()
-
-    merged_Yp = pd.merge(df1_30y_mean, df1_10y_mean, on=["Lat","Lon"], suffixes=("_30y","_10y"))
-    merged_Yp["Dif_Yp"] =  merged_Yp["Storage_10y"] -merged_Yp["Storage_30y"]
-
-    merged_rainfed = pd.merge(df2_30y_mean, df2_10y_mean, on=["Lat","Lon"], suffixes=("_30y","_10y"))
-    merged_rainfed["Dif_rainfed"] = merged_rainfed["Storage_10y"] - merged_rainfed["Storage_30y"] 
-
-    # Reindex onto mask grid
-    df_mask = pd.DataFrame({
-        "Lat": mask.lat.values.repeat(len(mask.lon)),
-        "Lon": np.tile(mask.lon.values, len(mask.lat))
-    })
-    merged_Yp = pd.merge(df_mask, merged_Yp, on=["Lat","Lon"], how="left")
-    merged_rainfed = pd.merge(df_mask, merged_rainfed, on=["Lat","Lon"], how="left")
-
-    grid1_Yp = merged_Yp["Storage_30y"].values.reshape(len(mask.lat), len(mask.lon))
-    grid2_Yp = merged_Yp["Storage_10y"].values.reshape(len(mask.lat), len(mask.lon))
-    dif_Yp = merged_Yp["Dif_Yp"].values.reshape(len(mask.lat), len(mask.lon))
-
-    grid1_rainfed = merged_rainfed["Storage_30y"].values.reshape(len(mask.lat), len(mask.lon))
-    grid2_rainfed = merged_rainfed["Storage_10y"].values.reshape(len(mask.lat), len(mask.lon))
-    dif_rainfed = merged_rainfed["Dif_rainfed"].values.reshape(len(mask.lat), len(mask.lon))
+    df1 = read_table(f1, "annual")
+    df2 = read_table(f2, "annual")
+
+    # Period means from one cumulative pass per scenario, on the mask grid
+    lat, lon = mask.lat.values, mask.lon.values
+    clim_Yp = table_climatology(df1, ["Storage"], lat=lat, lon=lon)
+    clim_rainfed = table_climatology(df2, ["Storage"], lat=lat, lon=lon)
+
+    grid1_Yp = window_mean(clim_Yp, "Storage", 1990, 2019).values
+    grid2_Yp = window_mean(clim_Yp, "Storage", 2010, 2019).values
+    grid1_rainfed = window_mean(clim_rainfed, "Storage", 1990, 2019).values
+    grid2_rainfed = window_mean(clim_rainfed, "Storage", 2010, 2019).values
+
+    # Only pixels with data in both periods are compared
+    both_Yp = ~np.isnan(grid1_Yp) & ~np.isnan(grid2_Yp)
+    grid1_Yp, grid2_Yp = np.where(both_Yp, grid1_Yp, np.nan), np.where(both_Yp, grid2_Yp, np.nan)
+    dif_Yp = grid2_Yp - grid1_Yp
+
+    both_rainfed = ~np.isnan(grid1_rainfed) & ~np.isnan(grid2_rainfed)
+    grid1_rainfed, grid2_rainfed = np.where(both_rainfed, grid1_rainfed, np.nan), np.where(both_rainfed, grid2_rainfed, np.nan)
+    dif_rainfed = grid2_rainfed - grid1_rainfed
 
     # Apply mask
     mask_vals = mask.values
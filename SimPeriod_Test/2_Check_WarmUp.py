@@ -1,10 +1,18 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.dates import date_of
+from Utils.parquet_store import read_pixels
 
 output_dir = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/2_1_Baseline"
 plot_dir = "/lustre/nobackup/WUR/ESG/zhou111/4_RQ1_Analysis_Results/Warm_Up_test"
 
+# Pixel-sorted daily outputs, built from the CSVs in output_dir by Utils/parquet_store.py
+# (read from the CSVs themselves while that copy is missing or older than them)
+parquet_root = os.path.join(output_dir, "Parquet")
+
 Basins = ["Rhine", "Indus", "Yangtze", "LaPlata"]
 Crops = ["winterwheat", "maize", "mainrice", "secondrice", "soybean"]
 
@@ -48,22 +56,16 @@ for basin in Basins:
             print(f"Missing file: {file}")
             continue
 
-        ds = pd.read_csv(file)
-
-        # Filter time range
-        ds = ds[(ds["Year"] >= 2005) & (ds["Year"] <= 2019)]
-
-        # Find closest grid cell to checkpoint
-        ds["dist"] = (ds["Lat"] - lat_chk).abs() + (ds["Lon"] - lon_chk).abs()
-        ds_point = ds.loc[ds["dist"].idxmin()].copy()  # single grid ID
-
-        # Now filter dataset only for that grid
-        lat_near = ds_point["Lat"]
-        lon_near = ds_point["Lon"]
-        df = ds[(ds["Lat"] == lat_near) & (ds["Lon"] == lon_near)]
+        # Read only the grid cell closest to the checkpoint, 2005-2019
+        df = read_pixels(parquet_root, basin, crop, [(lat_chk, lon_chk)], years=(2005, 2019), nearest=True)
+        if df.empty:
+            print(f"No data for {basin} {crop} near ({lat_chk}, {lon_chk})")
+            continue
+        lat_near = df["Lat"].iloc[0]
+        lon_near = df["Lon"].iloc[0]
 
         # Create a time axis (Year + Day of year)
-        df["Date"] = pd.to_datetime(df["Year"].astype(str), format="%Y") + pd.to_timedelta(df["Day"] - 1, unit="D")
+        df["Date"] = date_of(df["Year"], df["Day"])
 
         # Plot
         fig, ax = plt.subplots(3, 1, figsize=(10, 9), sharex=True)
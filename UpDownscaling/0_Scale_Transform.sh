@@ -7,16 +7,24 @@
 
 #-----------------------------Required resources-----------------------
 #SBATCH --time=600
-#SBATCH --mem=250000
+#SBATCH --mem=32000
+#SBATCH --cpus-per-task=4
 
 #--------------------Environment, Operations and Job steps-------------
 source /home/WUR/zhou111/miniconda3/etc/profile.d/conda.sh
 
 conda activate myenv
 
-# 1. Aggregate daily results
+# 0. (Once) Cache the daily and annual .csv outputs as Parquet, partitioned by basin/crop/year
+# python /lustre/nobackup/WUR/ESG/zhou111/1_RQ1_Code/3_Results_Analysis/Utils/parquet_store.py
+
+# 1. Aggregate daily results (monthly, annual runoff and growing season in one pass over each daily file)
+# python /lustre/nobackup/WUR/ESG/zhou111/1_RQ1_Code/3_Results_Analysis/UpDownscaling/1_Aggregate_Daily_AllScales.py
+# or one product per run:
 # python /lustre/nobackup/WUR/ESG/zhou111/1_RQ1_Code/3_Results_Analysis/UpDownscaling/1_Aggregate_Daily2Mon.py
 # python /lustre/nobackup/WUR/ESG/zhou111/1_RQ1_Code/3_Results_Analysis/UpDownscaling/1_Aggregate_Daily2Annual.py
+# Sums per crop season and phenological window (emergence-anthesis, anthesis-maturity, N/P demand)
+# python /lustre/nobackup/WUR/ESG/zhou111/1_RQ1_Code/3_Results_Analysis/UpDownscaling/1_Aggregate_Daily2Stage.py
 
 # 2. Redistribute annual results to monthly
 # python /lustre/nobackup/WUR/ESG/zhou111/1_RQ1_Code/3_Results_Analysis/UpDownscaling/2_Downscale_Annaul2Mon.py
@@ -1,45 +1,67 @@
-import pandas as pd
 import numpy as np
 import xarray as xr
+import os
+import sys
 from pathlib import Path
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.aggregate import stream_groupby_sum
+from Utils.dates import month_of, year_of
+from Utils.incremental import resume_year, update_netcdf
+from Utils.parallel import run_basin_crop
+
 basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
 crops = ["winterwheat", "maize", "mainrice", "secondrice", "soybean"]
 
 daily_dir_tpl = Path("/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Output_Rainfed/{basin}_{crop}_daily.csv")
 
-for basin in basins:
-    for crop in crops:
-        daily_fp = daily_dir_tpl.with_name(f"{basin}_{crop}_daily.csv")
-        if not daily_fp.exists():
-            print(f"{daily_fp} does not exist, skipping.")
-            continue
-
-        df = pd.read_csv(daily_fp)
-        df['Date'] = pd.to_datetime(df['Year'].astype(str), format='%Y') + pd.to_timedelta(df['Day'] - 1, unit='D')
-        df['Month'] = df['Date'].dt.month
-        df['Year'] = df['Date'].dt.year
-
-        # Compute total runoff
-        df['Runoff'] = df['SurfaceRunoff'] + df['SubsurfaceRunoff']
-
-        # Annual aggregation
-        sum_cols_all = ['SurfaceRunoff', 'SubsurfaceRunoff', 'Runoff']
-        annual_all = df.groupby(['Lat', 'Lon', 'Year'])[sum_cols_all].sum().reset_index()
-
-        # Convert to xarray Dataset
-        ds = annual_all.set_index(['Year', 'Lat', 'Lon']).to_xarray()
-
-        # Assign attributes
-        for var in sum_cols_all:
-            ds[var].attrs['units'] = 'cm'  # or the correct unit for your runoff
-            ds[var].attrs['long_name'] = var
-
-        ds.attrs['description'] = f"Annual agricultural runoff for {crop} in {basin}"
-        ds.attrs['source'] = "Model output processed from daily WOFOST simulations"
-        ds.attrs['creator'] = "Yixuan Zhou"
-
-        # Save as NetCDF
-        nc_fp = f"/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Test_CriticalNP/WOFOST_Runoff/Rainfed/{basin}_{crop}_runoff.nc"
-        ds.to_netcdf(nc_fp)
-        print(f"Saved annual NetCDF: {nc_fp}")
\ No newline at end of file
+# Peak memory [MB] for reading the daily CSV in chunks; None loads the whole file at once
+memory_budget_mb = 8000
+
+# True after a run was extended by new years: only the years from the last one already in the
+# runoff file are aggregated and appended. Keep False after re-running aggregated years.
+incremental = False
+
+sum_cols_all = ['SurfaceRunoff', 'SubsurfaceRunoff', 'Runoff']
+
+def add_columns(df):
+    df['Month'] = month_of(df['Year'], df['Day'])
+    df['Year'] = year_of(df['Year'], df['Day'])
+
+    # Compute total runoff
+    df['Runoff'] = df['SurfaceRunoff'] + df['SubsurfaceRunoff']
+    return df
+
+def process(basin, crop):
+    daily_fp = daily_dir_tpl.with_name(f"{basin}_{crop}_daily.csv")
+    if not daily_fp.exists():
+        print(f"{daily_fp} does not exist, skipping.")
+        return
+
+    nc_fp = f"/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Test_CriticalNP/WOFOST_Runoff/Rainfed/{basin}_{crop}_runoff.nc"
+    first_year = resume_year([(nc_fp, 'Year')]) if incremental else None
+
+    # Annual aggregation, chunk by chunk
+    annual_all = stream_groupby_sum(daily_fp, ['Lat', 'Lon', 'Year'], sum_cols_all,
+                                    prepare=add_columns, memory_budget_mb=memory_budget_mb, table="daily",
+                                    first_year=first_year)
+
+    # Convert to xarray Dataset
+    ds = annual_all.set_index(['Year', 'Lat', 'Lon']).to_xarray()
+
+    # Assign attributes
+    for var in sum_cols_all:
+        ds[var].attrs['units'] = 'cm'  # or the correct unit for your runoff
+        ds[var].attrs['long_name'] = var
+
+    ds.attrs['description'] = f"Annual agricultural runoff for {crop} in {basin}"
+    ds.attrs['source'] = "Model output processed from daily WOFOST simulations"
+    ds.attrs['creator'] = "Yixuan Zhou"
+
+    # Save as NetCDF
+    update_netcdf(nc_fp, ds, 'Year', first_year=first_year)
+    print(f"Saved annual NetCDF: {nc_fp}")
+
+
+if __name__ == "__main__":
+    run_basin_crop(process, basins, crops, task_memory_mb=memory_budget_mb)
@@ -1,43 +1,58 @@
-import pandas as pd
 import numpy as np
+import os
+import sys
 from pathlib import Path
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.aggregate import stream_groupby_sum
+from Utils.dates import month_of
+from Utils.incremental import resume_year, update_table
+from Utils.parallel import run_basin_crop
+
 basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
 crops = ["winterwheat", "maize", "mainrice", "secondrice", "soybean"]
 
 daily_dir_tpl = Path("/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Output_Rainfed/{basin}_{crop}_daily.csv")
 
-for basin in basins:
-    for crop in crops:
-        daily_fp = daily_dir_tpl.with_name(f"{basin}_{crop}_daily.csv")
-        if not daily_fp.exists():
-            print(f"{daily_fp} does not exist, skipping.")
-            continue
-
-        df = pd.read_csv(daily_fp)
-        df['Date'] = pd.to_datetime(df['Year'].astype(str), format='%Y') + pd.to_timedelta(df['Day'] - 1, unit='D')
-        df['Month'] = df['Date'].dt.month
-
-        # Deficits
-        df['N_deficit'] = np.where(df['N_uptake'] > 0,np.maximum(df['N_uptake'] - df['N_avail'], 0),0)
-        df['P_deficit'] = np.where(df['P_uptake'] > 0,np.maximum(df['P_uptake'] - df['P_avail'], 0),0)
-        df['Days_Fertilization'] = ((df['Fertilization'] == 11) | (df['Fertilization'] == 12)).astype(int)
-
-        # Crop-specific dev stage mask
-        if crop == 'soybean':
-            dev_mask = (df['Dev_Stage'] > 0) & (df['Dev_Stage'] < 1.5)
-        else:
-            dev_mask = (df['Dev_Stage'] > 0) & (df['Dev_Stage'] < 1.3)
-
-        # Aggregate sums
-        sum_cols_all = ['SurfaceRunoff','SubsurfaceRunoff','Percolation',
-                        'Days_Fertilization','N_uptake','P_uptake',
-                        'N_deficit','P_deficit','N_decomp','P_decomp',
-                        'P_Surf','P_Sub','P_Leaching']
-
-        # Aggregate general sums
-        monthly_all = df.groupby(['Lat','Lon','Year','Month'])[sum_cols_all].sum().reset_index()
-
-        monthly_fp = daily_fp.parent / f"{basin}_{crop}_monthly.csv"
-        monthly_all.to_csv(monthly_fp, index=False)
-        print(f"Saved monthly data: {monthly_fp}")
+# Peak memory [MB] for reading the daily CSV in chunks; None loads the whole file at once
+memory_budget_mb = 8000
+
+# True after a run was extended by new years: only the years from the last one already in the
+# monthly file are aggregated and spliced in. Keep False after re-running aggregated years.
+incremental = False
+
+# Aggregate sums
+sum_cols_all = ['SurfaceRunoff','SubsurfaceRunoff','Percolation',
+                'Days_Fertilization','N_uptake','P_uptake',
+                'N_deficit','P_deficit','N_decomp','P_decomp',
+                'P_Surf','P_Sub','P_Leaching']
+
+def add_columns(df):
+    df['Month'] = month_of(df['Year'], df['Day'])
+
+    # Deficits
+    df['N_deficit'] = np.where(df['N_uptake'] > 0,np.maximum(df['N_uptake'] - df['N_avail'], 0),0)
+    df['P_deficit'] = np.where(df['P_uptake'] > 0,np.maximum(df['P_uptake'] - df['P_avail'], 0),0)
+    df['Days_Fertilization'] = ((df['Fertilization'] == 11) | (df['Fertilization'] == 12)).astype(int)
+    return df
+
+def process(basin, crop):
+    daily_fp = daily_dir_tpl.with_name(f"{basin}_{crop}_daily.csv")
+    if not daily_fp.exists():
+        print(f"{daily_fp} does not exist, skipping.")
+        return
+
+    monthly_fp = daily_fp.parent / f"{basin}_{crop}_monthly.csv"
+    first_year = resume_year([(monthly_fp, 'Year')]) if incremental else None
+
+    # Aggregate general sums, chunk by chunk
+    monthly_all = stream_groupby_sum(daily_fp, ['Lat','Lon','Year','Month'], sum_cols_all,
+                                     prepare=add_columns, memory_budget_mb=memory_budget_mb, table="daily",
+                                     first_year=first_year)
+
+    update_table(monthly_fp, monthly_all, ['Lat','Lon','Year','Month'], first_year=first_year)
+    print(f"Saved monthly data: {monthly_fp}")
+
+
+if __name__ == "__main__":
+    run_basin_crop(process, basins, crops, task_memory_mb=memory_budget_mb)
@@ -0,0 +1,46 @@
+# Sums of daily WOFOST outputs per pixel, crop season and phenological window
+# (emergence-anthesis, anthesis-maturity and the crop-specific N/P demand window, see Utils/stages.py).
+import numpy as np
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.stages import stream_stage_aggregate
+from Utils.parallel import run_basin_crop
+
+basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
+crops = ["winterwheat", "maize", "mainrice", "secondrice", "soybean"]
+
+daily_dir = Path("/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Output_Rainfed")
+
+# Peak memory [MB] for reading the daily CSV in chunks; None loads the whole file at once
+memory_budget_mb = 8000
+
+# Derived columns, added to every chunk
+derived_cols = {
+    'N_deficit': lambda df: np.where(df['N_uptake'] > 0, np.maximum(df['N_uptake'] - df['N_avail'], 0), 0),
+    'P_deficit': lambda df: np.where(df['P_uptake'] > 0, np.maximum(df['P_uptake'] - df['P_avail'], 0), 0),
+}
+
+# Sums per window (Days: number of days in the window is always added)
+stage_cols = ['Transpiration','N_demand','N_uptake','N_deficit','N_decomp',
+              'P_demand','P_uptake','P_deficit','P_decomp',
+              'SurfaceRunoff','SubsurfaceRunoff','Percolation','P_Surf','P_Sub','P_Leaching']
+
+def process(basin, crop):
+    daily_fp = daily_dir / f"{basin}_{crop}_daily.csv"
+    if not daily_fp.exists():
+        print(f"{daily_fp} does not exist, skipping.")
+        return
+
+    stages = stream_stage_aggregate(daily_fp, crop, stage_cols, derived=derived_cols,
+                                    memory_budget_mb=memory_budget_mb)
+
+    stage_fp = daily_dir / f"{basin}_{crop}_stages.csv"
+    stages.to_csv(stage_fp, index=False)
+    print(f"Saved phenological window sums: {stage_fp}")
+
+
+if __name__ == "__main__":
+    run_basin_crop(process, basins, crops, task_memory_mb=memory_budget_mb)
@@ -0,0 +1,101 @@
+# Single pass over each daily WOFOST output: writes the monthly sums (.csv and .nc),
+# the annual runoff .nc used by Boundary/Test_Method2*.py and the growing-season sums.
+# Replaces running 1_Aggregate_Daily2Mon.py and 1_Aggregate_Daily2Annual.py one after the other.
+import numpy as np
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.aggregate import stream_aggregate
+from Utils.dates import month_of
+from Utils.incremental import resume_year, update_netcdf, update_table
+from Utils.parallel import run_basin_crop
+
+basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
+crops = ["winterwheat", "maize", "mainrice", "secondrice", "soybean"]
+
+daily_dir = Path("/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Output_Rainfed")
+runoff_dir = Path("/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Test_CriticalNP/WOFOST_Runoff/Rainfed")
+
+# Peak memory [MB] for reading the daily CSV in chunks; None loads the whole file at once
+memory_budget_mb = 8000
+
+# True after a run was extended by new years: only the years from the last one already in all
+# outputs are aggregated and spliced in (see Utils/incremental.py). Keep False after re-running
+# years that were aggregated before.
+incremental = False
+
+# Derived columns, added in this order to every chunk
+derived_cols = {
+    'Month': lambda df: month_of(df['Year'], df['Day']),
+    'Runoff': lambda df: df['SurfaceRunoff'] + df['SubsurfaceRunoff'],
+    'N_deficit': lambda df: np.where(df['N_uptake'] > 0, np.maximum(df['N_uptake'] - df['N_avail'], 0), 0),
+    'P_deficit': lambda df: np.where(df['P_uptake'] > 0, np.maximum(df['P_uptake'] - df['P_avail'], 0), 0),
+    'Days_Fertilization': lambda df: ((df['Fertilization'] == 11) | (df['Fertilization'] == 12)).astype(int),
+}
+
+monthly_cols = ['SurfaceRunoff','SubsurfaceRunoff','Percolation',
+                'Days_Fertilization','N_uptake','P_uptake',
+                'N_deficit','P_deficit','N_decomp','P_decomp',
+                'P_Surf','P_Sub','P_Leaching']
+runoff_cols = ['SurfaceRunoff', 'SubsurfaceRunoff', 'Runoff']
+season_cols = ['Runoff','Percolation','Days_Fertilization','N_uptake','P_uptake',
+               'N_deficit','P_deficit','N_decomp','P_decomp','P_Surf','P_Sub','P_Leaching']
+
+products = {
+    "monthly": {"keys": ['Lat','Lon','Year','Month'], "sum_cols": monthly_cols},
+    "annual": {"keys": ['Lat','Lon','Year'], "sum_cols": runoff_cols},
+    # growing season: days with the crop in the field (Dev_Stage > 0)
+    "season": {"keys": ['Lat','Lon','Year'], "sum_cols": season_cols, "mask": lambda df: df['Dev_Stage'] > 0},
+}
+
+def process(basin, crop):
+    daily_fp = daily_dir / f"{basin}_{crop}_daily.csv"
+    if not daily_fp.exists():
+        print(f"{daily_fp} does not exist, skipping.")
+        return
+
+    monthly_fp = daily_dir / f"{basin}_{crop}_monthly.csv"
+    monthly_nc = daily_dir / f"{basin}_{crop}_monthly.nc"
+    nc_fp = runoff_dir / f"{basin}_{crop}_runoff.nc"
+    season_fp = daily_dir / f"{basin}_{crop}_season.csv"
+
+    first_year = None
+    if incremental:
+        first_year = resume_year([(monthly_fp, 'Year'), (monthly_nc, 'Year'), (nc_fp, 'Year'), (season_fp, 'Year')])
+        if first_year is not None:
+            print(f"{basin} - {crop}: outputs exist up to {first_year}, aggregating {first_year} onwards")
+
+    results = stream_aggregate(daily_fp, products, derived=derived_cols,
+                               memory_budget_mb=memory_budget_mb, table="daily", first_year=first_year)
+
+    # Monthly sums (.csv as read by 2_Downscale_Annaul2Mon.py, and .nc)
+    monthly_new = results["monthly"]
+    update_table(monthly_fp, monthly_new, ['Lat','Lon','Year','Month'], first_year=first_year)
+    print(f"Saved monthly data: {monthly_fp}")
+
+    ds_mon = monthly_new.set_index(['Year', 'Month', 'Lat', 'Lon']).to_xarray()
+    ds_mon.attrs['description'] = f"Monthly sums for {crop} in {basin}"
+    update_netcdf(monthly_nc, ds_mon, 'Year', first_year=first_year)
+    print(f"Saved monthly NetCDF: {monthly_nc}")
+
+    # Annual runoff
+    ds = results["annual"].set_index(['Year', 'Lat', 'Lon']).to_xarray()
+    for var in runoff_cols:
+        ds[var].attrs['units'] = 'cm'
+        ds[var].attrs['long_name'] = var
+    ds.attrs['description'] = f"Annual agricultural runoff for {crop} in {basin}"
+    ds.attrs['source'] = "Model output processed from daily WOFOST simulations"
+    ds.attrs['creator'] = "Yixuan Zhou"
+
+    update_netcdf(nc_fp, ds, 'Year', first_year=first_year)
+    print(f"Saved annual NetCDF: {nc_fp}")
+
+    # Growing-season sums
+    update_table(season_fp, results["season"], ['Lat','Lon','Year'], first_year=first_year)
+    print(f"Saved growing-season data: {season_fp}")
+
+
+if __name__ == "__main__":
+    run_basin_crop(process, basins, crops, task_memory_mb=memory_budget_mb)
@@ -1,63 +1,67 @@
 import pandas as pd
 import os
+import sys
 import numpy as np
 
-def downscale_basin_crop(basin, crop, annual_dir, monthly_dir):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.parquet_store import load_output
+from Utils.schema import read_table
+from Utils.parallel import run_basin_crop
+
+# annual total -> (downscaled monthly column, monthly weight)
+ds_specs = {
+    "NH3":     ("NH3_ds",     "fert"),
+    "N2O":     ("N2O_ds",     "fert"),
+    "NOx":     ("NOx_ds",     "fert"),
+    "N_surf":  ("N_surf_ds",  "surf"),
+    "N_sub":   ("N_sub_ds",   "sub"),
+    "N_leach": ("N_leach_ds", "leach"),
+}
+
+def downscale_basin_crop(basin, crop, annual_dir, monthly_dir, out_file=None):
+    """Distribute annual N losses over the months of each cell-year, weighted by monthly fluxes.
+
+    Writes to out_file if given, otherwise updates {basin}_{crop}_monthly.csv in place.
+    """
 
     # File paths
     annual_file = os.path.join(annual_dir, f"{basin}_{crop}_annual.csv")
     monthly_file = os.path.join(monthly_dir, f"{basin}_{crop}_monthly.csv")
 
+    keys = ["Lat", "Lon", "Year"]
+
     # Load CSVs
-    annual_df = pd.read_csv(annual_file)
-    annual_df.columns = annual_df.columns.str.strip()
-    monthly_df = pd.read_csv(monthly_file)
-
-    # Initialize downscaled columns
-    for col in ["NH3_ds", "N2O_ds", "NOx_ds", "N_surf_ds", "N_sub_ds", "N_leach_ds"]:
-        monthly_df[col] = 0.0
-
-    # Helper functions
-    def safe_sum(df, col):
-        return df[col].sum() if col in df.columns else 0.0
-
-    def distribute(total, weights):
-        s = weights.sum()
-        return (total * weights / s) if s > 0 else np.zeros_like(weights)
-
-    # Loop over each grid cell and year
-    for (lat, lon, year), ann_grp in annual_df.groupby(["Lat", "Lon", "Year"]):
-        # Annual totals
-        NH3_yr    = safe_sum(ann_grp, "NH3")
-        N2O_yr    = safe_sum(ann_grp, "N2O")
-        NOx_yr    = safe_sum(ann_grp, "NOx")
-        Nsurf_yr  = safe_sum(ann_grp, "N_surf")
-        Nsub_yr   = safe_sum(ann_grp, "N_sub")
-        Nleach_yr = safe_sum(ann_grp, "N_leach")
-
-        # Select monthly rows for this cell/year
-        mask = (monthly_df["Lat"] == lat) & (monthly_df["Lon"] == lon) & (monthly_df["Year"] == year)
-        mon_grp = monthly_df.loc[mask].copy()
-        if mon_grp.empty:
-            continue
-
-        # Compute weights
-        w_fert  = mon_grp["Days_Fertilization"].fillna(0).values
-        w_surf  = (mon_grp["SurfaceRunoff"].fillna(0) * mon_grp["Days_Fertilization"].fillna(0)).values
-        w_sub   = (mon_grp["SubsurfaceRunoff"].fillna(0) * mon_grp["Days_Fertilization"].fillna(0)).values
-        w_leach = mon_grp["Percolation"].fillna(0).values
-
-        # Distribute annual totals to monthly
-        monthly_df.loc[mask, "NH3_ds"]    = distribute(NH3_yr, w_fert)
-        monthly_df.loc[mask, "N2O_ds"]    = distribute(N2O_yr, w_fert)
-        monthly_df.loc[mask, "NOx_ds"]    = distribute(NOx_yr, w_fert)
-        monthly_df.loc[mask, "N_surf_ds"] = distribute(Nsurf_yr, w_surf)
-        monthly_df.loc[mask, "N_sub_ds"]  = distribute(Nsub_yr, w_sub)
-        monthly_df.loc[mask, "N_leach_ds"]= distribute(Nleach_yr, w_leach)
+    annual_df = load_output(annual_file, "annual", columns=keys + list(ds_specs))
+    monthly_df = read_table(monthly_file, "monthly")
+
+    # Annual totals per grid cell and year (0 for columns missing from the annual file)
+    for col in ds_specs:
+        if col not in annual_df.columns:
+            annual_df[col] = 0.0
+    totals = annual_df.groupby(keys)[list(ds_specs)].sum()
+
+    # Monthly weights
+    fert = monthly_df["Days_Fertilization"].fillna(0)
+    weights = pd.DataFrame({
+        "fert":  fert,
+        "surf":  monthly_df["SurfaceRunoff"].fillna(0) * fert,
+        "sub":   monthly_df["SubsurfaceRunoff"].fillna(0) * fert,
+        "leach": monthly_df["Percolation"].fillna(0),
+    })
+    weight_sums = weights.groupby([monthly_df[k] for k in keys]).transform("sum")
+
+    # Annual totals on the monthly rows; months of cell-years without annual data get 0
+    month_totals = monthly_df[keys].join(totals, on=keys)[list(ds_specs)].fillna(0)
+
+    # Distribute annual totals to monthly (0 where the cell-year has no weight)
+    for col, (ds_col, w) in ds_specs.items():
+        s = weight_sums[w]
+        monthly_df[ds_col] = np.where(s > 0, month_totals[col] * weights[w] / s.where(s > 0, 1), 0.0)
 
     # Save updated monthly CSV
-    monthly_df.to_csv(monthly_file, index=False)
-    print(f"✅ Updated {monthly_file}")
+    out_file = monthly_file if out_file is None else out_file
+    monthly_df.to_csv(out_file, index=False)
+    print(f"✅ Updated {out_file}")
 
 # Example usage
 basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
@@ -65,11 +69,23 @@ crops = ["winterwheat", "maize", "mainrice", "secondrice", "soybean"]
 
 annual_dir="/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Output_Rainfed"
 
-for basin in basins:
-    for crop in crops:
-        annual_fp = os.path.join(annual_dir, f"{basin}_{crop}_annual.csv")
-        if not os.path.exists(annual_fp):
-            print(f"{annual_fp} does not exist, skipping.")
-            continue
-        
-        downscale_basin_crop(basin, crop, annual_dir, annual_dir)
\ No newline at end of file
+# None: add the *_ds columns to {basin}_{crop}_monthly.csv in place;
+# a file name such as "{basin}_{crop}_monthly_ds.csv" keeps the monthly file untouched
+out_name = None
+
+# Peak memory [MB] of one basin-crop task; sizes the process pool
+task_memory_mb = 4000
+
+
+def process(basin, crop):
+    annual_fp = os.path.join(annual_dir, f"{basin}_{crop}_annual.csv")
+    if not os.path.exists(annual_fp):
+        print(f"{annual_fp} does not exist, skipping.")
+        return
+
+    out_fp = None if out_name is None else os.path.join(annual_dir, out_name.format(basin=basin, crop=crop))
+    downscale_basin_crop(basin, crop, annual_dir, annual_dir, out_fp)
+
+
+if __name__ == "__main__":
+    run_basin_crop(process, basins, crops, task_memory_mb=task_memory_mb)
@@ -1,7 +1,11 @@
 import pandas as pd
 import numpy as np
-import xarray as xr
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.cube import build_cube
+from Utils.parallel import run_basin_crop
 
 # ---------------------------- #
 # User settings
@@ -16,47 +20,39 @@ crops = ["winterwheat", "maize", "mainrice", "secondrice", "soybean"] # ["winter
 # ---------------------------- #
 # Loop over basins and crops
 # ---------------------------- #
-for basin in basins:
-    for crop in crops:
-        csv_file = f"{data_path}/{basin}_{crop}_annual.csv"
-        if not os.path.exists(csv_file):
-            print(f"File not found, skipping: {csv_file}")
-            continue
-        
-        print(f"Processing: {csv_file}")
-        df = pd.read_csv(csv_file)
-
-        # Unique coordinates and times
-        lat = np.sort(df['Lat'].unique())
-        lon = np.sort(df['Lon'].unique())
-        time = np.sort(df['Year'].unique())
-
-        # Variables to store
-        var_names = [v for v in df.columns if v not in ['Lat','Lon','Year']]
-
-        # Initialize empty arrays
-        data_vars = {}
-        for var in var_names:
-            data_vars[var] = (('Year','lat','lon'), np.full((len(time), len(lat), len(lon)), np.nan))
-
-        # Fill arrays
-        for t_idx, yr in enumerate(time):
-            df_year = df[df['Year']==yr]
-            for j, la in enumerate(lat):
-                for k, lo in enumerate(lon):
-                    df_cell = df_year[(df_year['Lat']==la)&(df_year['Lon']==lo)]
-                    if not df_cell.empty:
-                        for var in var_names:
-                            data_vars[var][1][t_idx,j,k] = df_cell[var].values[0]
-
-        # Create xarray Dataset
-        ds = xr.Dataset(
-            {var: xr.DataArray(data_vars[var][1], coords={'Year':time,'lat':lat,'lon':lon}, dims=('Year','lat','lon'))
-             for var in var_names},
-            coords={'Year':time, 'lat':lat, 'lon':lon}
-        )
-
-        # Save NetCDF
-        nc_file = f"{output_dir}/{basin}_{crop}_annual.nc"
-        ds.to_netcdf(nc_file)
-        print(f"Saved: {nc_file}")
+# Peak memory [MB] of one basin-crop task; sizes the process pool
+task_memory_mb = 4000
+
+
+def process(basin, crop):
+    csv_file = f"{data_path}/{basin}_{crop}_annual.csv"
+    if not os.path.exists(csv_file):
+        print(f"File not found, skipping: {csv_file}")
+        return
+
+    print(f"Processing: {csv_file}")
+    df = pd.read_csv(csv_file)
+
+    # Unique coordinates and times
+    lat = np.sort(df['Lat'].unique())
+    lon = np.sort(df['Lon'].unique())
+    time = np.sort(df['Year'].unique())
+
+    # Variables to store
+    var_names = [v for v in df.columns if v not in ['Lat','Lon','Year']]
+
+    # One row per cell and year: keep the first, as the old per-cell filter did
+    df = df.drop_duplicates(subset=['Year','Lat','Lon'], keep='first')
+
+    # Scatter every variable onto the (Year, lat, lon) grid in one pass over the rows;
+    # dims and coords share the 'Year' name so the Dataset is consistent
+    ds = build_cube(df, {var: var for var in var_names}, lat, lon, years=time, dims=('Year','lat','lon'))
+
+    # Save NetCDF
+    nc_file = f"{output_dir}/{basin}_{crop}_annual.nc"
+    ds.to_netcdf(nc_file)
+    print(f"Saved: {nc_file}")
+
+
+if __name__ == "__main__":
+    run_basin_crop(process, basins, crops, task_memory_mb=task_memory_mb)
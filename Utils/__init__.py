@@ -0,0 +1,2 @@
+# Shared helpers for the RQ1 result analysis scripts.
+# Scripts add the repository root to sys.path and import e.g. `from Utils.cube import build_cube`.
@@ -0,0 +1,105 @@
+import pandas as pd
+
+from Utils.reduce import group_reduce
+from Utils.schema import read_table
+
+
+def read_csv(csv_file, table=None, **kwargs):
+    """pd.read_csv, or the typed reader of Utils.schema if the output table is given."""
+    if table is None:
+        return pd.read_csv(csv_file, **kwargs)
+    if "nrows" in kwargs:
+        return next(read_table(csv_file, table, chunksize=kwargs["nrows"]))
+    return read_table(csv_file, table, **kwargs)
+
+
+def rows_per_chunk(csv_file, memory_budget_mb, sample_rows=10_000, overhead=4, table=None):
+    """Number of CSV rows that fit in the memory budget, estimated from the first rows of the file.
+
+    overhead accounts for derived columns and groupby temporaries on top of the parsed chunk.
+    """
+    sample = read_csv(csv_file, table, nrows=sample_rows)
+    bytes_per_row = sample.memory_usage(index=True, deep=True).sum() / max(len(sample), 1)
+    return max(int(memory_budget_mb * 1024**2 / (bytes_per_row * overhead)), 1)
+
+
+def combine(total, partials):
+    """Merge partial group sums into the running total."""
+    frames = ([] if total is None else [total]) + partials
+    if len(frames) == 1:
+        return frames[0]
+    keys = list(frames[0].index.names)
+    return group_reduce(pd.concat(frames).reset_index(), keys, frames[0].columns, as_index=True)
+
+
+def add_derived(df, derived):
+    """Add derived columns in order; derived maps a column name to a function of the frame."""
+    for name, func in derived.items():
+        df[name] = func(df)
+    return df
+
+
+def stream_aggregate(csv_file, products, derived=None, prepare=None, memory_budget_mb=None, table=None,
+                     first_year=None):
+    """Several groupby sums computed from a single pass over a CSV read in chunks.
+
+    products maps an output name to {"keys": [...], "sum_cols": [...], "mask": func (optional)};
+    mask(chunk) selects the rows that enter that product, e.g. the growing season.
+    derived: {column: func(chunk)} added to every chunk before grouping (see add_derived).
+    prepare(chunk): free-form alternative to derived, applied first.
+    memory_budget_mb: peak memory for the chunks; None reads the whole file at once.
+    table: "daily", "monthly" or "annual" to read with the compact types of Utils.schema.
+    first_year: skip rows of earlier years (after prepare), to extend existing outputs (see Utils.incremental).
+    Returns {name: DataFrame} equal to df.groupby(keys)[sum_cols].sum().reset_index()
+    per product, up to floating-point summation order.
+    """
+    if memory_budget_mb is None:
+        chunksize = None
+        reader = [read_csv(csv_file, table)]
+    else:
+        chunksize = rows_per_chunk(csv_file, memory_budget_mb, table=table)
+        reader = read_csv(csv_file, table, chunksize=chunksize)
+
+    totals = {name: None for name in products}
+    partials = {name: [] for name in products}
+    pending = {name: 0 for name in products}
+
+    for chunk in reader:
+        if prepare is not None:
+            chunk = prepare(chunk)
+        if first_year is not None:
+            keep = chunk["Year"] >= first_year
+            if not keep.all():
+                chunk = chunk[keep].copy()
+        if derived:
+            chunk = add_derived(chunk, derived)
+
+        for name, spec in products.items():
+            rows = chunk[spec["mask"](chunk)] if spec.get("mask") else chunk
+            part = group_reduce(rows, spec["keys"], spec["sum_cols"], as_index=True)
+            partials[name].append(part)
+            pending[name] += len(part)
+
+            # fold the partial sums in once they take as much room as a chunk
+            if chunksize is not None and pending[name] > chunksize:
+                totals[name] = combine(totals[name], partials[name])
+                partials[name], pending[name] = [], 0
+
+    results = {}
+    for name, spec in products.items():
+        if totals[name] is None and not partials[name]:
+            results[name] = pd.DataFrame(columns=spec["keys"] + spec["sum_cols"])
+        else:
+            results[name] = combine(totals[name], partials[name]).reset_index()
+    return results
+
+
+def stream_groupby_sum(csv_file, keys, sum_cols, prepare=None, memory_budget_mb=None, table=None, first_year=None):
+    """df.groupby(keys)[sum_cols].sum().reset_index() for a CSV read in chunks.
+
+    prepare(chunk) adds derived columns (Month, Runoff, ...) and returns the chunk.
+    Only the running sums per group are kept between chunks (see stream_aggregate).
+    """
+    products = {"sum": {"keys": keys, "sum_cols": sum_cols}}
+    return stream_aggregate(csv_file, products, prepare=prepare, memory_budget_mb=memory_budget_mb, table=table,
+                            first_year=first_year)["sum"]
@@ -0,0 +1,119 @@
+import numpy as np
+import xarray as xr
+
+from Utils.cube import axis_index
+
+# A climatology holds, per variable, the running sums and non-NaN counts along the year axis,
+# padded with a leading zero: sum over years[a:b] = csum[b] - csum[a]. Once built, the mean,
+# sum or anomaly of any year window is two lookups per pixel, however long the window.
+
+
+def cumulate(sums, counts, years, dims, coords):
+    """Climatology from per-year sums and counts of shape (year, ...) for each variable."""
+    clim = {"years": np.asarray(years), "dims": dims, "coords": coords, "sum": {}, "count": {}}
+    for var in sums:
+        shape = (len(years) + 1,) + sums[var].shape[1:]
+        clim["sum"][var] = np.zeros(shape)
+        clim["count"][var] = np.zeros(shape, dtype=np.int32)
+        np.cumsum(sums[var], axis=0, out=clim["sum"][var][1:])
+        np.cumsum(counts[var], axis=0, out=clim["count"][var][1:])
+    return clim
+
+
+def climatology(data, dim="year"):
+    """Climatology of every variable of a Dataset (or of one DataArray) along dim; NaN values are skipped."""
+    ds = data.to_dataset() if isinstance(data, xr.DataArray) else data
+    ds = ds.sortby(dim)
+
+    sums, counts = {}, {}
+    for var, da in ds.data_vars.items():
+        values = da.transpose(dim, ...).values.astype(np.float64)
+        valid = ~np.isnan(values)
+        sums[var] = np.where(valid, values, 0.0)
+        counts[var] = valid
+        template = da.transpose(dim, ...).isel({dim: 0}, drop=True)
+
+    coords = {d: template[d].values for d in template.dims}
+    return cumulate(sums, counts, ds[dim].values, template.dims, coords)
+
+
+def table_climatology(df, variables, lat=None, lon=None):
+    """Climatology of annual table columns on a (lat, lon) grid.
+
+    Rows of the same pixel and year are pooled, so window means equal
+    df[Year in window].groupby(["Lat", "Lon"])[variables].mean(). lat/lon default to the pixels in df.
+    """
+    years = np.unique(df["Year"].to_numpy())
+    lat = np.unique(df["Lat"].dropna()) if lat is None else np.asarray(lat)
+    lon = np.unique(df["Lon"].dropna()) if lon is None else np.asarray(lon)
+
+    t = axis_index(df["Year"].to_numpy(), years)
+    i = axis_index(df["Lat"].to_numpy(), lat)
+    j = axis_index(df["Lon"].to_numpy(), lon)
+    keep = (t >= 0) & (i >= 0) & (j >= 0)
+    cell = ((t * len(lat) + i) * len(lon) + j)[keep]
+    shape = (len(years), len(lat), len(lon))
+
+    sums, counts = {}, {}
+    for var in variables:
+        values = df[var].to_numpy(dtype=np.float64)[keep]
+        valid = ~np.isnan(values)
+        sums[var] = np.bincount(cell[valid], weights=values[valid], minlength=np.prod(shape)).reshape(shape)
+        counts[var] = np.bincount(cell[valid], minlength=np.prod(shape)).reshape(shape)
+
+    return cumulate(sums, counts, years, ("lat", "lon"), {"lat": lat, "lon": lon})
+
+
+def window_slice(clim, first, last):
+    """Positions (a, b) in the padded cumulative arrays for the years first..last (inclusive)."""
+    return np.searchsorted(clim["years"], first, side="left"), np.searchsorted(clim["years"], last, side="right")
+
+
+def to_dataarray(clim, values, name):
+    return xr.DataArray(values, dims=clim["dims"], coords=clim["coords"], name=name)
+
+
+def window_sum(clim, var, first, last):
+    a, b = window_slice(clim, first, last)
+    return to_dataarray(clim, clim["sum"][var][b] - clim["sum"][var][a], var)
+
+
+def window_count(clim, var, first, last):
+    """Number of non-NaN years per pixel in the window."""
+    a, b = window_slice(clim, first, last)
+    return to_dataarray(clim, clim["count"][var][b] - clim["count"][var][a], var)
+
+
+def window_mean(clim, var, first, last):
+    """Mean over the years first..last, NaN where the pixel has no value in the window (like mean(skipna=True))."""
+    a, b = window_slice(clim, first, last)
+    n = clim["count"][var][b] - clim["count"][var][a]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (clim["sum"][var][b] - clim["sum"][var][a]) / n
+    return to_dataarray(clim, np.where(n > 0, mean, np.nan), var)
+
+
+def window_anomaly(clim, var, window, reference):
+    """Mean over window minus mean over reference; both are (first, last) year pairs."""
+    return window_mean(clim, var, *window) - window_mean(clim, var, *reference)
+
+
+def window_means(clim, var, windows):
+    """Means for many (first, last) windows at once, stacked along a "window" dimension labelled "first-last"."""
+    a, b = np.array([window_slice(clim, first, last) for first, last in windows]).T
+    n = clim["count"][var][b] - clim["count"][var][a]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, (clim["sum"][var][b] - clim["sum"][var][a]) / n, np.nan)
+    labels = [f"{first}-{last}" for first, last in windows]
+    return xr.DataArray(mean, dims=("window",) + tuple(clim["dims"]),
+                        coords={"window": labels, **clim["coords"]}, name=var)
+
+
+def window_frame(clim, variables, first, last):
+    """Window means of a table climatology as a Lat/Lon DataFrame holding only the pixels with data,
+    in the layout of df.groupby(["Lat", "Lon"])[variables].mean().reset_index()."""
+    means = xr.Dataset({var: window_mean(clim, var, first, last) for var in variables})
+    has_data = sum((window_count(clim, var, first, last) > 0).astype(int) for var in variables) > 0
+
+    frame = means.to_dataframe().reset_index().rename(columns={"lat": "Lat", "lon": "Lon"})
+    return frame[has_data.values.ravel()].reset_index(drop=True)[["Lat", "Lon"] + list(variables)]
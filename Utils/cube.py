@@ -0,0 +1,67 @@
+import numpy as np
+import xarray as xr
+
+
+def axis_index(values, axis):
+    """Return the position of every value on axis (exact match), -1 where it is not on the axis."""
+    values = np.asarray(values)
+    axis = np.asarray(axis)
+    if axis.size == 0:
+        return np.full(values.shape, -1, dtype=np.int64)
+
+    order = np.argsort(axis, kind="stable")
+    sorted_axis = axis[order]
+    pos = np.clip(np.searchsorted(sorted_axis, values), 0, axis.size - 1)
+    found = sorted_axis[pos] == values
+    return np.where(found, order[pos], -1)
+
+
+def column_values(df, source):
+    """Values of one CSV column, or the row-wise sum of a list of columns (NaN propagates)."""
+    if isinstance(source, str):
+        return df[source].to_numpy(dtype=np.float64)
+    total = df[source[0]].to_numpy(dtype=np.float64).copy()
+    for col in source[1:]:
+        total += df[col].to_numpy(dtype=np.float64)
+    return total
+
+
+def build_cube(df, variables, lat, lon, years=None, dims=("year", "lat", "lon")):
+    """Scatter the rows of an annual table onto a (year, lat, lon) Dataset in one step.
+
+    variables maps output names to a column, or to a list of columns that are summed,
+    e.g. {"Yield": "Storage", "N_Runoff": ["N_surf", "N_sub"]}.
+    Rows whose Lat/Lon/Year are not on the grid are dropped, cells without a row stay NaN.
+    """
+    if years is None:
+        years = sorted(df["Year"].unique())
+
+    t = axis_index(df["Year"].to_numpy(), years)
+    i = axis_index(df["Lat"].to_numpy(), lat)
+    j = axis_index(df["Lon"].to_numpy(), lon)
+    keep = (t >= 0) & (i >= 0) & (j >= 0)
+
+    names = list(variables)
+    values = np.stack([column_values(df, variables[name])[keep] for name in names])
+
+    # (var, year, lat, lon), filled for all variables at once
+    cube = np.full((len(names), len(years), len(lat), len(lon)), np.nan)
+    cube[:, t[keep], i[keep], j[keep]] = values
+
+    return xr.Dataset(
+        {name: (dims, cube[k]) for k, name in enumerate(names)},
+        coords={dims[0]: years, dims[1]: lat, dims[2]: lon}
+    )
+
+
+def open_crop_cube(files, crops, var, chunks=None):
+    """One lazy Dataset with var as a (crop, lat, lon) array, from one file per crop, read with dask.
+
+    Reductions over "crop" (totals, subsets, fractions) computed together with dask.compute
+    read every file once. The returned Dataset holds the open files: close it (or use it in a
+    with block) once the results are computed.
+    """
+    ds = xr.open_mfdataset(files, combine="nested", concat_dim="crop", data_vars=[var],
+                           coords="minimal", compat="override", chunks=chunks or {})
+    ds.coords["crop"] = list(crops)  # in place, so the Dataset keeps its file handles to close
+    return ds
@@ -0,0 +1,89 @@
+from functools import lru_cache
+
+import numpy as np
+
+# the model writes Year + day of year; every (year, day) pair is looked up in a precomputed table
+# of 366 days per year, so deriving dates is an integer gather instead of datetime arithmetic
+first_year = 1900
+last_year = 2100
+days_per_year = 366
+
+# meteorological seasons, stored as codes into season_names
+season_names = np.array(["DJF", "MAM", "JJA", "SON"])
+month_season = np.array([0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype=np.int8)  # index: month (0 unused)
+
+
+@lru_cache(maxsize=None)
+def calendar_table(first=first_year, last=last_year):
+    """Calendar fields for day 1..366 of every year in [first, last], flattened to (year - first) * 366 + day - 1.
+
+    Day 366 of a non-leap year is 1 January of the next year, the same as Year + timedelta(Day - 1).
+    """
+    years = np.arange(first, last + 1) - 1970
+    dates = (years.astype("datetime64[Y]").astype("datetime64[D]")[:, None] + np.arange(days_per_year)).ravel()
+    months = dates.astype("datetime64[M]")
+    month = (months.astype(np.int64) % 12 + 1).astype(np.int8)
+    return {
+        "date": dates.astype("datetime64[ns]"),
+        "year": (dates.astype("datetime64[Y]").astype(np.int64) + 1970).astype(np.int16),
+        "month": month,
+        "day": ((dates - months).astype(np.int64) + 1).astype(np.int8),
+        "season": month_season[month],
+    }
+
+
+def lookup(year, day, field):
+    """Calendar field ("date", "year", "month", "day" of month or "season" code) for arrays of Year and day of year."""
+    year = np.asarray(year, dtype=np.int64)
+    day = np.asarray(day, dtype=np.int64)
+    if year.size == 0:
+        return calendar_table()[field][:0]
+
+    first, last = first_year, last_year
+    if year.min() < first or year.max() > last:
+        first, last = min(first, int(year.min())), max(last, int(year.max()))
+    table = calendar_table(first, last)[field]
+
+    valid = (day >= 1) & (day <= days_per_year)
+    pos = (year - first) * days_per_year + np.where(valid, day, 1) - 1
+    out = table[pos]
+
+    # days outside 1..366 (not written by the model) roll over like a timedelta would
+    if not valid.all():
+        dates = (year[~valid] - 1970).astype("datetime64[Y]").astype("datetime64[D]") + (day[~valid] - 1)
+        out[~valid] = derive(dates.astype("datetime64[ns]"), field)
+    return out
+
+
+def derive(dates, field):
+    """Calendar field computed from datetime64 values (fallback for rows outside the table)."""
+    if field == "date":
+        return dates
+    months = dates.astype("datetime64[M]")
+    month = months.astype(np.int64) % 12 + 1
+    if field == "year":
+        return dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    if field == "month":
+        return month
+    if field == "day":
+        return (dates.astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64) + 1
+    if field == "season":
+        return month_season[month]
+    raise KeyError(field)
+
+
+def date_of(year, day):
+    return lookup(year, day, "date")
+
+
+def year_of(year, day):
+    return lookup(year, day, "year")
+
+
+def month_of(year, day):
+    return lookup(year, day, "month")
+
+
+def season_of(year, day):
+    """Season code per row (0 DJF, 1 MAM, 2 JJA, 3 SON); season_names[code] gives the label."""
+    return lookup(year, day, "season")
@@ -0,0 +1,84 @@
+import numpy as np
+import xarray as xr
+
+# Ensemble statistics over climate models (GCMs) without stacking them. For one chunk along the
+# time axis at a time, every model's slice is read and folded into running count, mean, M2, min
+# and max (Welford), so memory holds the outputs plus one chunk, however many models there are.
+
+
+def open_concat(files, dim):
+    """Files of one model as one lazy Dataset, concatenated along dim (read with dask)."""
+    return xr.open_mfdataset(sorted(files), combine="nested", concat_dim=dim)
+
+
+def new_state(shape):
+    return {
+        "n": np.zeros(shape, dtype=np.int32),
+        "mean": np.zeros(shape),
+        "m2": np.zeros(shape),
+        "min": np.full(shape, np.inf),
+        "max": np.full(shape, -np.inf),
+    }
+
+
+def update(state, values):
+    """Welford update with one model's values; NaN values are skipped."""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    state["n"] += valid
+    delta = np.where(valid, values - state["mean"], 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        state["mean"] += np.where(valid, delta / state["n"], 0.0)
+    state["m2"] += np.where(valid, delta * (values - state["mean"]), 0.0)
+    np.fmin(state["min"], values, out=state["min"])
+    np.fmax(state["max"], values, out=state["max"])
+
+
+def finalize(state, ddof=0):
+    """mean, std, min and max of the state; NaN where no model has a value."""
+    n = state["n"]
+    empty = n == 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(state["m2"] / (n - ddof))
+    std[n <= ddof] = np.nan
+    out = {"mean": state["mean"].copy(), "std": std, "min": state["min"].copy(), "max": state["max"].copy()}
+    for values in out.values():
+        values[empty] = np.nan
+    return out
+
+
+def ensemble_stats(models, dim="time", chunk=120, variables=None, ddof=0):
+    """Ensemble mean and spread of several models' Datasets, along dim in chunks of chunk steps.
+
+    models: {name: Dataset} on the same grid and dim coordinate (lazy datasets are read chunk by chunk).
+    NaN values are skipped, so the mean equals xr.concat(models, "model").mean("model").
+    Returns (mean Dataset with the model variables, spread Dataset with {var}_std, {var}_min, {var}_max).
+    """
+    names = list(models)
+    template = models[names[0]]
+    for name in names[1:]:
+        if models[name].sizes[dim] != template.sizes[dim]:
+            raise ValueError(f"{name} has {models[name].sizes[dim]} steps along {dim}, "
+                             f"{names[0]} has {template.sizes[dim]}")
+    if variables is None:
+        variables = [var for var in template.data_vars if dim in template[var].dims]
+
+    mean, spread = {}, {}
+    for var in variables:
+        da = template[var].transpose(dim, ...)
+        stats = {key: np.full(da.shape, np.nan) for key in ("mean", "std", "min", "max")}
+        for start in range(0, da.shape[0], chunk):
+            part = slice(start, min(start + chunk, da.shape[0]))
+            state = new_state((part.stop - part.start,) + da.shape[1:])
+            for name in names:
+                update(state, models[name][var].transpose(dim, ...).isel({dim: part}).values)
+            for key, values in finalize(state, ddof).items():
+                stats[key][part] = values
+
+        coords = {d: da[d] for d in da.dims if d in da.coords}
+        mean[var] = xr.DataArray(stats["mean"], dims=da.dims, coords=coords, attrs=da.attrs)
+        for key in ("std", "min", "max"):
+            spread[f"{var}_{key}"] = xr.DataArray(stats[key], dims=da.dims, coords=coords, attrs=da.attrs)
+
+    attrs = {"models": ", ".join(names)}
+    return xr.Dataset(mean, attrs=attrs), xr.Dataset(spread, attrs=attrs)
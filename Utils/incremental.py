@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Extending a simulation by a few years should not rebuild its aggregates from the start.
+# resume_year finds where the existing outputs end; only daily rows from that year on are
+# aggregated again, and update_table / update_netcdf splice them into the outputs. The last
+# existing year is always recomputed, in case it was written from an unfinished run.
+
+
+def existing_years(path, dim="Year"):
+    """Years present in an output: a CSV (dim column), a NetCDF (dim coordinate) or a Year-partitioned Parquet dataset."""
+    path = str(path)
+    if not os.path.exists(path):
+        return np.array([], dtype=np.int64)
+    if os.path.isdir(path):
+        parts = [name.split("=", 1)[1] for name in os.listdir(path) if name.startswith(f"{dim}=")]
+        return np.unique(np.array(parts, dtype=np.int64))
+    if path.endswith(".nc"):
+        with xr.open_dataset(path) as ds:
+            return np.unique(ds[dim].values)
+    return np.unique(pd.read_csv(path, usecols=[dim])[dim].dropna().astype(np.int64))
+
+
+def resume_year(outputs):
+    """First year to aggregate so that every output is complete again.
+
+    outputs: [(path, dim)]. Returns the last year that all outputs contain, or None (full rebuild)
+    when one of them is missing or empty.
+    """
+    last = []
+    for path, dim in outputs:
+        years = existing_years(path, dim)
+        if len(years) == 0:
+            return None
+        last.append(int(years.max()))
+    return min(last)
+
+
+def update_table(path, new, keys, dim="Year", first_year=None):
+    """Write new to the CSV at path, replacing the rows with dim >= first_year; rows stay sorted by keys.
+
+    first_year None writes new as the whole table (full rebuild).
+    """
+    if first_year is None or not os.path.exists(path):
+        table = new
+    else:
+        old = pd.read_csv(path)
+        old = old[old[dim] < first_year]
+        table = pd.concat([old, new], ignore_index=True).sort_values(keys, kind="stable").reset_index(drop=True)
+    table.to_csv(path, index=False)
+    return table
+
+
+def update_netcdf(path, new, dim="Year", first_year=None):
+    """Write new to the NetCDF at path, replacing the slices with dim >= first_year (concatenated along dim).
+
+    The file is written through a temporary copy, so an interrupted update leaves the old file intact.
+    """
+    path = str(path)
+    if first_year is None or not os.path.exists(path):
+        new.to_netcdf(path)
+        return new
+
+    with xr.open_dataset(path) as old:
+        old = old.sel({dim: old[dim] < first_year}).load()
+    ds = xr.concat([old, new], dim=dim, join="outer").sortby(dim)
+    ds.attrs = new.attrs
+
+    ds.to_netcdf(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return ds
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+
+# one manifest per output directory: {output file name: {"params": digest, "inputs": {path: state}}}
+manifest_name = "export_manifest.json"
+
+
+def file_hash(path, block_size=1 << 20):
+    """sha256 of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_state(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime": st.st_mtime_ns, "sha256": file_hash(path)}
+
+
+def params_digest(params):
+    """Digest of the export parameters (variable mapping, fill value, ...), so changing them forces a rerun."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, manifest_name)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except ValueError:
+        print(f"!!! Unreadable manifest {path}, converting everything")
+        return {}
+
+
+def save_manifest(out_dir, manifest):
+    """Write the manifest through a temporary file, so an interrupted run never leaves it half written."""
+    path = os.path.join(out_dir, manifest_name)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def is_current(manifest, output_file, inputs, params):
+    """True if output_file exists and was exported from the same inputs with the same parameters.
+
+    Inputs are compared by size and mtime first; only when the mtime changed is the file hashed,
+    so a copied or touched but identical CSV is not converted again.
+    """
+    entry = manifest.get(os.path.basename(output_file))
+    if entry is None or not os.path.exists(output_file):
+        return False
+    if entry["params"] != params_digest(params) or set(entry["inputs"]) != set(inputs):
+        return False
+
+    for path in inputs:
+        old = entry["inputs"][path]
+        if not os.path.exists(path):
+            return False
+        st = os.stat(path)
+        if st.st_size != old["size"]:
+            return False
+        if st.st_mtime_ns != old["mtime"]:
+            if file_hash(path) != old["sha256"]:
+                return False
+            old["mtime"] = st.st_mtime_ns
+    return True
+
+
+def record(manifest, output_file, inputs, params):
+    """Register a finished export in the manifest (call save_manifest to persist it)."""
+    manifest[os.path.basename(output_file)] = {
+        "params": params_digest(params),
+        "inputs": {path: file_state(path) for path in inputs},
+    }
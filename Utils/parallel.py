@@ -0,0 +1,83 @@
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+
+def available_cores():
+    """Cores granted to this job (SLURM --cpus-per-task), else the cores this process may run on."""
+    if os.environ.get("SLURM_CPUS_PER_TASK"):
+        return int(os.environ["SLURM_CPUS_PER_TASK"])
+    return len(os.sched_getaffinity(0))
+
+
+def available_memory_mb():
+    """Memory granted to this job (SLURM --mem, else the cgroup limit), else the free memory of the node."""
+    if os.environ.get("SLURM_MEM_PER_NODE"):
+        return int(os.environ["SLURM_MEM_PER_NODE"])
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            limit = f.read().strip()
+        if limit != "max":
+            return int(limit) // 1024**2
+    except OSError:
+        pass
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) // 1024
+    return None
+
+
+def worker_count(n_tasks, task_memory_mb=None, max_workers=None):
+    """Number of processes: bounded by the cores, by the memory / task_memory_mb and by the number of tasks."""
+    workers = min(available_cores(), max(n_tasks, 1))
+    if max_workers is not None:
+        workers = min(workers, max_workers)
+    memory = available_memory_mb()
+    if task_memory_mb and memory:
+        workers = min(workers, memory // task_memory_mb)
+    return max(int(workers), 1)
+
+
+def call(func, task):
+    """Run one task in a worker; errors are returned with their traceback instead of stopping the pool."""
+    try:
+        return func(*task), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def run_tasks(func, tasks, task_memory_mb=None, max_workers=None):
+    """Run func(*task) for every task in a process pool.
+
+    task_memory_mb: peak memory of one task, used to size the pool (see worker_count).
+    Returns [(task, result, error)] in the order of tasks; error is None or the traceback text.
+    With a single worker the tasks run in this process, one after the other.
+    """
+    tasks = [tuple(task) for task in tasks]
+    workers = worker_count(len(tasks), task_memory_mb, max_workers)
+    print(f"Running {len(tasks)} tasks on {workers} worker(s)")
+
+    if workers == 1:
+        outcomes = [call(func, task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(call, func, task) for task in tasks]
+            outcomes = [future.result() for future in futures]
+    return [(task, result, error) for task, (result, error) in zip(tasks, outcomes)]
+
+
+def run_basin_crop(func, basins, crops, task_memory_mb=None, max_workers=None):
+    """func(basin, crop) for every combination, concurrently; see run_tasks."""
+    tasks = [(basin, crop) for basin in basins for crop in crops]
+    results = run_tasks(func, tasks, task_memory_mb, max_workers)
+    report_errors(results)
+    return results
+
+
+def report_errors(results):
+    failed = [(task, error) for task, _, error in results if error is not None]
+    for task, error in failed:
+        print(f"!!! {' - '.join(map(str, task))} failed:\n{error}")
+    if failed:
+        print(f"{len(failed)} of {len(results)} tasks failed")
@@ -0,0 +1,275 @@
+import os
+import sys
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as pds
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.incremental import existing_years
+from Utils.schema import calendar_cols, coord_cols, read_table, tables
+
+# ------------------- USER SETTINGS -------------------
+basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
+crops = ["winterwheat", "maize", "mainrice", "secondrice", "soybean", "wheat"]
+freqs = ["annual", "daily"]
+
+# each folder gets its cache in {csv_dir}/Parquet; these are the folders the analysis scripts
+# read (other folders can be given on the command line: python parquet_store.py DIR [DIR ...])
+model_output_root = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs"
+csv_dirs = [os.path.join(model_output_root, d) for d in [
+    "3_Scenarios/2_1_Baseline", "3_Scenarios/2_1_Baseline_Krate01", "Test_Decomp_off",
+    "Water-Nutrient-Limited", "Output", "Output_Rainfed", "Output_Unsus_Irrigation", "S1", "S2",
+    "Yp-Irrigated", "Yp-Limited-Irrigation", "Yp-Rainfed",
+    "Ya-Irrigated", "Ya-Limited-Irrigation", "Ya-Rainfed",
+]]
+
+# True: only add the Year partitions from the last cached year on (after a run was extended)
+incremental = False
+# -----------------------------------------------------
+
+# column types follow Utils.schema: int16 calendar, float64 coordinates, float32 values
+year_partitioning = pds.partitioning(pa.schema([("Year", pa.int16())]), flavor="hive")
+
+
+def dataset_dir(root, basin, crop, freq):
+    """Directory of one basin-crop table: {root}/{freq}/basin={basin}/crop={crop}/Year=YYYY/*.parquet"""
+    return os.path.join(root, freq, f"basin={basin}", f"crop={crop}")
+
+
+def to_table(chunk):
+    fields = [(c, pa.int16() if c in calendar_cols else pa.float64() if c in coord_cols else pa.float32())
+              for c in chunk.columns]
+    return pa.Table.from_pandas(chunk, schema=pa.schema(fields), preserve_index=False)
+
+
+def csv_to_parquet(csv_file, root, basin, crop, freq, chunksize=2_000_000, incremental=False):
+    """Convert one WOFOST output CSV to a zstd-compressed Parquet dataset partitioned by Year.
+
+    The CSV is read in chunks, so the daily files never have to fit in memory. An existing
+    dataset for the same basin/crop/freq is replaced; with incremental=True only the partitions
+    from its last year on are rewritten and the years after it are appended.
+    """
+    out = dataset_dir(root, basin, crop, freq)
+    years = existing_years(out) if incremental else []
+    first_year = int(max(years)) if len(years) else None
+    if first_year is None and os.path.exists(out):
+        shutil.rmtree(out)
+    elif first_year is not None:
+        for year in years[years >= first_year]:
+            shutil.rmtree(os.path.join(out, f"Year={year}"))
+
+    for n, chunk in enumerate(read_table(csv_file, freq, chunksize=chunksize)):
+        if first_year is not None:
+            chunk = chunk[chunk["Year"] >= first_year]
+            if chunk.empty:
+                continue
+        pq.write_to_dataset(
+            to_table(chunk), out,
+            partition_cols=["Year"],
+            basename_template=f"part-{n}-{{i}}.parquet",
+            compression="zstd",
+        )
+    return out
+
+
+def read_output(root, basin, crop, freq, columns=None, years=None):
+    """Read a basin-crop table from the Parquet cache as a DataFrame.
+
+    columns: only these columns are read (Year is always available for filtering); columns the
+    table does not have are skipped, as with usecols in read_table.
+    years: (first, last) inclusive; Year partitions outside the window are not opened.
+    """
+    dataset = pds.dataset(dataset_dir(root, basin, crop, freq), format="parquet", partitioning=year_partitioning)
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+
+    filt = None
+    if years is not None:
+        filt = (pds.field("Year") >= years[0]) & (pds.field("Year") <= years[1])
+
+    return dataset.to_table(columns=columns, filter=filt).to_pandas()
+
+
+def cached_dataset(csv_file, freq):
+    """(root, basin, crop) of the Parquet cache of {csv_dir}/{basin}_{crop}_{freq}.csv, or None if
+    there is no cache at least as new as the CSV."""
+    name = os.path.basename(csv_file)[:-len(".csv")].split("_")
+    if len(name) != 3 or name[2] != freq:
+        return None
+    root = os.path.join(os.path.dirname(csv_file), "Parquet")
+    if not is_current(dataset_dir(root, name[0], name[1], freq), csv_file):
+        return None
+    return root, name[0], name[1]
+
+
+def is_current(cache, csv_file):
+    """True if the cache path exists and the CSV was not rewritten after it was built."""
+    if not os.path.exists(cache):
+        return False
+    return not os.path.exists(csv_file) or os.path.getmtime(cache) >= os.path.getmtime(csv_file)
+
+
+def source_csv(root, basin, crop, freq):
+    """The CSV a cache under root ({csv_dir}/Parquet) is built from."""
+    return os.path.join(os.path.dirname(os.path.normpath(root)), f"{basin}_{crop}_{freq}.csv")
+
+
+def load_output(csv_file, freq, columns=None, years=None):
+    """A WOFOST output table, from its Parquet cache when there is one, else from the CSV.
+
+    Drop-in for read_table(csv_file, freq, usecols=columns): listed columns have the schema types
+    (unlisted ones are float32 in the cache), cached columns come in the schema order.
+    years: (first, last) inclusive; with the cache only those Year partitions are read.
+    """
+    cached = cached_dataset(csv_file, freq)
+    if cached is not None:
+        df = read_output(*cached, freq, columns=columns, years=years)
+        order = [c for c in tables[freq] if c in df.columns]
+        return df[order + [c for c in df.columns if c not in order]]
+
+    read_cols = columns
+    if columns is not None and years is not None and "Year" not in columns:
+        read_cols = list(columns) + ["Year"]
+    df = read_table(csv_file, freq, usecols=read_cols)
+    if years is not None:
+        df = df[(df["Year"] >= years[0]) & (df["Year"] <= years[1])].reset_index(drop=True)
+        if read_cols is not columns:
+            df = df.drop(columns="Year")
+    return df
+
+
+def pixel_file(root, basin, crop, freq="daily"):
+    """Pixel-sorted copy of a table: one row group per pixel, listed in the matching _index.csv"""
+    return os.path.join(root, f"{freq}_by_pixel", f"{basin}_{crop}.parquet")
+
+
+def pixel_index_file(root, basin, crop, freq="daily"):
+    return pixel_file(root, basin, crop, freq).replace(".parquet", "_index.csv")
+
+
+def csv_to_pixel_parquet(csv_file, root, basin, crop, freq="daily", n_buckets=64, chunksize=2_000_000):
+    """Rewrite a WOFOST output CSV sorted by pixel, so that one pixel can be read on its own.
+
+    Pass 1 spreads the rows over n_buckets temporary Parquet buckets by hashing Lat/Lon;
+    pass 2 sorts one bucket at a time and writes every pixel as its own row group.
+    Peak memory is about one CSV chunk or one bucket, whichever is larger.
+    """
+    out_file = pixel_file(root, basin, crop, freq)
+    tmp_dir = out_file + ".buckets"
+    os.makedirs(os.path.dirname(out_file), exist_ok=True)
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+
+    # pass 1: bucket rows by pixel
+    for n, chunk in enumerate(read_table(csv_file, freq, chunksize=chunksize)):
+        table = to_table(chunk)
+        bucket = pd.util.hash_pandas_object(chunk[["Lat", "Lon"]], index=False) % n_buckets
+        table = table.append_column("bucket", pa.array(bucket.to_numpy(), pa.int16()))
+        pq.write_to_dataset(table, tmp_dir, partition_cols=["bucket"],
+                            basename_template=f"part-{n}-{{i}}.parquet")
+
+    # pass 2: one row group per pixel, sorted by time within the pixel
+    writer, index = None, []
+    for b in range(n_buckets):
+        bucket_dir = os.path.join(tmp_dir, f"bucket={b}")
+        if not os.path.exists(bucket_dir):
+            continue
+        rows = pq.read_table(bucket_dir).to_pandas()
+        rows = rows.drop(columns="bucket", errors="ignore")
+        sort_cols = [c for c in ["Lat", "Lon", "Year", "Month", "Day"] if c in rows.columns]
+        rows = rows.sort_values(sort_cols, kind="stable")
+        for (lat, lon), pixel_rows in rows.groupby(["Lat", "Lon"], sort=False):
+            table = to_table(pixel_rows.reset_index(drop=True))
+            if writer is None:
+                writer = pq.ParquetWriter(out_file, table.schema, compression="zstd")
+            writer.write_table(table, row_group_size=len(pixel_rows))
+            index.append((lat, lon, len(index)))
+    if writer is not None:
+        writer.close()
+    shutil.rmtree(tmp_dir)
+
+    pd.DataFrame(index, columns=["Lat", "Lon", "row_group"]).to_csv(pixel_index_file(root, basin, crop, freq), index=False)
+    return out_file
+
+
+def nearest_points(pixels, points):
+    """The pixel closest (|dLat| + |dLon|) to every point, from a Lat/Lon DataFrame."""
+    return [tuple(pixels.loc[((pixels["Lat"] - lat).abs() + (pixels["Lon"] - lon).abs()).idxmin(), ["Lat", "Lon"]])
+            for lat, lon in points]
+
+
+def read_pixels(root, basin, crop, points, freq="daily", columns=None, years=None, nearest=False):
+    """Read only the row groups of the requested pixels from the pixel-sorted table.
+
+    points: [(lat, lon), ...]; exact matches, or the closest pixel (|dLat| + |dLon|) if nearest.
+    years: (first, last) inclusive.
+    Without a pixel-sorted copy at least as new as {basin}_{crop}_{freq}.csv next to root, the
+    pixels are read from the CSV instead.
+    """
+    csv_file = source_csv(root, basin, crop, freq)
+    if not (is_current(pixel_file(root, basin, crop, freq), csv_file)
+            and os.path.exists(pixel_index_file(root, basin, crop, freq))):
+        return read_csv_pixels(csv_file, freq, points, columns, years, nearest)
+
+    index = pd.read_csv(pixel_index_file(root, basin, crop, freq))
+    if nearest:
+        points = nearest_points(index, points)
+    row_groups = []
+    for lat, lon in points:
+        row_groups.extend(index.loc[(index["Lat"] == lat) & (index["Lon"] == lon), "row_group"])
+
+    read_cols = columns
+    if columns is not None and years is not None and "Year" not in columns:
+        read_cols = list(columns) + ["Year"]
+
+    pf = pq.ParquetFile(pixel_file(root, basin, crop, freq))
+    df = pf.read_row_groups(sorted(set(row_groups)), columns=read_cols).to_pandas()
+    if years is not None:
+        df = df[(df["Year"] >= years[0]) & (df["Year"] <= years[1])].reset_index(drop=True)
+        if read_cols is not columns:
+            df = df.drop(columns="Year")
+    return df
+
+
+def read_csv_pixels(csv_file, freq, points, columns=None, years=None, nearest=False, chunksize=2_000_000):
+    """read_pixels from the CSV itself, chunk by chunk (a first Lat/Lon-only pass finds the nearest pixels)."""
+    if nearest:
+        pixels = pd.concat([chunk.drop_duplicates() for chunk in
+                            read_table(csv_file, freq, usecols=["Lat", "Lon"], chunksize=chunksize)])
+        points = nearest_points(pixels.drop_duplicates().reset_index(drop=True), points)
+    wanted = pd.DataFrame(points, columns=["Lat", "Lon"]).drop_duplicates()
+
+    read_cols = None if columns is None else list(dict.fromkeys(list(columns) + ["Lat", "Lon", "Year"]))
+    parts = []
+    for chunk in read_table(csv_file, freq, usecols=read_cols, chunksize=chunksize):
+        if years is not None:
+            chunk = chunk[(chunk["Year"] >= years[0]) & (chunk["Year"] <= years[1])]
+        parts.append(chunk.merge(wanted, on=["Lat", "Lon"]))
+    df = pd.concat(parts, ignore_index=True)
+
+    # same row order as the pixel-sorted copy: by pixel, then in time
+    sort_cols = [c for c in ["Lat", "Lon", "Year", "Month", "Day"] if c in df.columns]
+    df = df.sort_values(sort_cols, kind="stable").reset_index(drop=True)
+    return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+
+# ------------------- MAIN -------------------
+if __name__ == "__main__":
+    for csv_dir in sys.argv[1:] or csv_dirs:
+        parquet_root = os.path.join(csv_dir, "Parquet")
+        for basin in basins:
+            for crop in crops:
+                for freq in freqs:
+                    csv_file = os.path.join(csv_dir, f"{basin}_{crop}_{freq}.csv")
+                    if not os.path.exists(csv_file):
+                        print(f"{csv_file} does not exist, skipping.")
+                        continue
+                    out = csv_to_parquet(csv_file, parquet_root, basin, crop, freq, incremental=incremental)
+                    print(f"Saved {out}")
+
+                    # pixel-sorted copy for point time series
+                    if freq == "daily":
+                        out = csv_to_pixel_parquet(csv_file, parquet_root, basin, crop, freq)
+                        print(f"Saved {out}")
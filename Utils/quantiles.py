@@ -0,0 +1,200 @@
+import json
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Mergeable quantile sketches. A sketch keeps the values themselves while it is small (exact
+# percentiles, as np.percentile) and switches to logarithmic buckets once it holds more than
+# exact_limit values: bucket k covers gamma^(k-1) < |x| <= gamma^k, so every quantile is known to a
+# relative accuracy alpha. Sketches of different basins, crops or scenarios are merged by adding
+# the bucket counts, so pooled percentiles do not need the data again. NaN and inf are skipped.
+exact_limit = 100_000
+alpha = 0.005
+min_magnitude = 1e-12  # |x| below this counts as zero
+
+
+def gamma_of(accuracy=alpha):
+    return (1 + accuracy) / (1 - accuracy)
+
+
+def empty_sketch(accuracy=alpha):
+    return {"n": 0, "alpha": accuracy, "values": np.empty(0), "pos": {}, "neg": {}, "zero": 0,
+            "min": np.inf, "max": -np.inf}
+
+
+def bucket_counts(magnitudes, gamma):
+    """{bucket key: count} of positive magnitudes."""
+    keys = np.ceil(np.log(magnitudes) / np.log(gamma)).astype(np.int64)
+    uniq, counts = np.unique(keys, return_counts=True)
+    return dict(zip(uniq.tolist(), counts.tolist()))
+
+
+def add_counts(a, b):
+    out = dict(a)
+    for key, count in b.items():
+        out[key] = out.get(key, 0) + count
+    return out
+
+
+def to_buckets(sk):
+    """Move the exact values of a sketch into its buckets."""
+    values = sk["values"]
+    if values is None or len(values) == 0:
+        sk["values"] = None
+        return sk
+    gamma = gamma_of(sk["alpha"])
+    small = np.abs(values) < min_magnitude
+    sk["pos"] = add_counts(sk["pos"], bucket_counts(values[(values > 0) & ~small], gamma))
+    sk["neg"] = add_counts(sk["neg"], bucket_counts(-values[(values < 0) & ~small], gamma))
+    sk["zero"] += int(small.sum())
+    sk["values"] = None
+    return sk
+
+
+def sketch(values, accuracy=alpha, limit=None):
+    """Sketch of the finite values of a 1-D array."""
+    limit = exact_limit if limit is None else limit
+    values = np.asarray(values, dtype=np.float64).ravel()
+    values = values[np.isfinite(values)]
+    sk = empty_sketch(accuracy)
+    sk["n"] = len(values)
+    sk["values"] = values
+    if len(values):
+        sk["min"], sk["max"] = float(values.min()), float(values.max())
+    return to_buckets(sk) if len(values) > limit else sk
+
+
+def merge(*sketches, limit=None):
+    """One sketch of the union of the data of all sketches (all built with the same accuracy)."""
+    limit = exact_limit if limit is None else limit
+    out = empty_sketch(sketches[0]["alpha"])
+    exact = all(sk["values"] is not None for sk in sketches)
+    for sk in sketches:
+        if sk["alpha"] != out["alpha"]:
+            raise ValueError("Only sketches with the same accuracy can be merged")
+        out["n"] += sk["n"]
+        out["min"], out["max"] = min(out["min"], sk["min"]), max(out["max"], sk["max"])
+        if not exact:
+            sk = to_buckets(dict(sk))
+            out["pos"] = add_counts(out["pos"], sk["pos"])
+            out["neg"] = add_counts(out["neg"], sk["neg"])
+            out["zero"] += sk["zero"]
+
+    if exact:
+        out["values"] = np.concatenate([sk["values"] for sk in sketches])
+        if out["n"] > limit:
+            out = to_buckets(out)
+    else:
+        out["values"] = None
+    return out
+
+
+def quantiles(sk, percentiles):
+    """Percentiles (0-100) of the sketched data; NaN for an empty sketch."""
+    percentiles = np.atleast_1d(np.asarray(percentiles, dtype=np.float64))
+    if sk["n"] == 0:
+        return np.full(len(percentiles), np.nan)
+    if sk["values"] is not None:
+        return np.percentile(sk["values"], percentiles)
+
+    # buckets in ascending order of value: negatives (largest magnitude first), zeros, positives
+    gamma = gamma_of(sk["alpha"])
+    neg = sorted(sk["neg"], reverse=True)
+    pos = sorted(sk["pos"])
+    centers = np.concatenate([
+        -2 * gamma ** np.array(neg, dtype=np.float64) / (gamma + 1),
+        [0.0],
+        2 * gamma ** np.array(pos, dtype=np.float64) / (gamma + 1),
+    ])
+    counts = np.array([sk["neg"][k] for k in neg] + [sk["zero"]] + [sk["pos"][k] for k in pos])
+    rank = percentiles / 100 * (sk["n"] - 1)
+    found = np.searchsorted(np.cumsum(counts), rank, side="right")
+    return np.clip(centers[np.minimum(found, len(centers) - 1)], sk["min"], sk["max"])
+
+
+def sketch_table(df, variables, accuracy=alpha, limit=None):
+    """{variable: sketch} for columns of a DataFrame."""
+    return {var: sketch(df[var].to_numpy(dtype=np.float64), accuracy, limit) for var in variables}
+
+
+def merge_tables(*tables, limit=None):
+    """Merge {variable: sketch} tables variable by variable (variables missing in a table are skipped)."""
+    variables = list(dict.fromkeys(var for table in tables for var in table))
+    return {var: merge(*[table[var] for table in tables if var in table], limit=limit) for var in variables}
+
+
+def batch_percentiles(values, percentiles):
+    """Percentiles of every column of a (rows, columns) array, all in one np.percentile call.
+
+    Each column is partitioned once for all percentiles. Non-finite values are skipped.
+    Returns an array of shape (len(percentiles), columns).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    percentiles = np.atleast_1d(np.asarray(percentiles, dtype=np.float64))
+    if values.shape[0] == 0:
+        return np.full((len(percentiles), values.shape[1]), np.nan)
+    finite = np.isfinite(values)
+    if finite.all():
+        return np.percentile(values, percentiles, axis=0)
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns give NaN
+        return np.nanpercentile(np.where(finite, values, np.nan), percentiles, axis=0)
+
+
+def tidy(variables, percentiles, values):
+    """Variable / P10 / P90 table from (len(percentiles), len(variables)) values."""
+    out = pd.DataFrame({"Variable": list(variables)})
+    for p, row in zip(percentiles, np.asarray(values)):
+        out[f"P{p:g}"] = row
+    return out
+
+
+def percentile_table(df, variables, percentiles=(10, 90)):
+    """Exact percentiles of many DataFrame columns at once, as a tidy Variable / P10 / P90 table."""
+    variables = list(variables)
+    return tidy(variables, percentiles, batch_percentiles(df[variables].to_numpy(dtype=np.float64), percentiles))
+
+
+def summary(tables, percentiles=(10, 90)):
+    """Tidy Variable / P10 / P90 (one column per percentile) table of a {variable: sketch} table.
+
+    Exact sketches of the same size are stacked and done in one batch_percentiles call.
+    """
+    variables = list(tables)
+    values = np.full((len(percentiles), len(variables)), np.nan)
+    batches = {}
+    for j, var in enumerate(variables):
+        sk = tables[var]
+        if sk["values"] is not None and sk["n"] > 0:
+            batches.setdefault(sk["n"], []).append(j)
+        else:
+            values[:, j] = quantiles(sk, percentiles)
+    for cols in batches.values():
+        stacked = np.column_stack([tables[variables[j]]["values"] for j in cols])
+        values[:, cols] = batch_percentiles(stacked, percentiles)
+    return tidy(variables, percentiles, values)
+
+
+def save_sketches(path, tables):
+    """Write a {variable: sketch} table to JSON so later runs can pool it without the source data."""
+    out = {}
+    for var, sk in tables.items():
+        out[var] = {**sk,
+                    "values": None if sk["values"] is None else sk["values"].tolist(),
+                    "pos": {str(k): v for k, v in sk["pos"].items()},
+                    "neg": {str(k): v for k, v in sk["neg"].items()}}
+    with open(path + ".tmp", "w") as f:
+        json.dump(out, f)
+    os.replace(path + ".tmp", path)
+
+
+def load_sketches(path):
+    with open(path) as f:
+        data = json.load(f)
+    for sk in data.values():
+        sk["values"] = None if sk["values"] is None else np.asarray(sk["values"], dtype=np.float64)
+        sk["pos"] = {int(k): v for k, v in sk["pos"].items()}
+        sk["neg"] = {int(k): v for k, v in sk["neg"].items()}
+    return data
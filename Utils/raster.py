@@ -0,0 +1,99 @@
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+# Aggregation of fine rasters (e.g. SPAM 5 arcmin GeoTIFFs) onto a coarse lat/lon grid. The target
+# cell of every pixel follows from the affine transform for the whole array at once; values are
+# accumulated with bincount, so no pixel is visited in Python. Rasters are read in row windows.
+
+
+def default_nodata(src):
+    """nodata of a raster, with the usual SPAM fallbacks when the file does not define it."""
+    if src.nodata is not None:
+        return src.nodata
+    return -9999.0 if src.dtypes[0] == "float32" else 0
+
+
+def nearest_index(values, axis):
+    """Position of the nearest axis value for every value (like np.abs(axis - v).argmin()).
+
+    The axis may be ascending or descending; values outside it map to the first or last position.
+    """
+    axis = np.asarray(axis, dtype=np.float64)
+    if len(axis) == 1:
+        return np.zeros(np.shape(values), dtype=np.int64)
+    order = np.argsort(axis, kind="stable")
+    sorted_axis = axis[order]
+    right = np.clip(np.searchsorted(sorted_axis, values), 1, len(axis) - 1)
+    left = right - 1
+    d_left = np.abs(values - sorted_axis[left])
+    d_right = np.abs(sorted_axis[right] - values)
+    # ties go to the value that comes first on the original axis, as argmin does
+    take_right = (d_right < d_left) | ((d_right == d_left) & (order[right] < order[left]))
+    return order[np.where(take_right, right, left)]
+
+
+def pixel_centers(transform, rows, cols):
+    """x (lon) and y (lat) of pixel centers, as rasterio.transform.xy."""
+    x = transform.c + (cols + 0.5) * transform.a + (rows + 0.5) * transform.b
+    y = transform.f + (cols + 0.5) * transform.d + (rows + 0.5) * transform.e
+    return x, y
+
+
+def target_cells(transform, shape, lat, lon, row_off=0, col_off=0):
+    """Flat index into a (lat, lon) grid of every pixel of a block of the given shape."""
+    rows = np.arange(row_off, row_off + shape[0], dtype=np.float64)[:, None]
+    cols = np.arange(col_off, col_off + shape[1], dtype=np.float64)[None, :]
+    if transform.b == 0 and transform.d == 0:
+        # north-up raster: lat depends on the row and lon on the column only
+        _, y = pixel_centers(transform, rows, np.zeros_like(rows))
+        x, _ = pixel_centers(transform, np.zeros_like(cols), cols)
+        i = nearest_index(y[:, 0], lat)[:, None]
+        j = nearest_index(x[0], lon)[None, :]
+        return (i * len(lon) + j).ravel()
+    x, y = pixel_centers(transform, rows, cols)
+    return (nearest_index(y, lat) * len(lon) + nearest_index(x, lon)).ravel()
+
+
+def accumulate(data, nodata, cells, sums, counts):
+    """Add the valid pixels of a block (not nodata, not NaN) to the per-cell sums and counts."""
+    data = data.ravel()
+    valid = data != nodata
+    if np.issubdtype(data.dtype, np.floating):
+        valid &= ~np.isnan(data)
+    sums += np.bincount(cells[valid], weights=data[valid].astype(np.float64), minlength=len(sums))
+    counts += np.bincount(cells[valid], minlength=len(counts))
+
+
+def finalize(sums, counts, shape, method="sum"):
+    """Per-cell sum or mean on the target grid; NaN where no valid pixel fell in the cell."""
+    if method not in ("sum", "mean"):
+        raise ValueError(f"Unknown aggregation method: {method}")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = sums / counts if method == "mean" else sums.copy()
+    out[counts == 0] = np.nan
+    return out.reshape(shape)
+
+
+def row_windows(height, width, window_rows):
+    """Full-width windows of window_rows rows covering a raster."""
+    for row_off in range(0, height, window_rows):
+        yield Window(0, row_off, width, min(window_rows, height - row_off))
+
+
+def aggregate_raster(file_path, lat, lon, method="sum", band=1, window_rows=512):
+    """Sum or mean of the valid pixels of one raster band in the nearest cell of a (lat, lon) grid.
+
+    The band is read in windows of window_rows full rows in its own data type, so memory stays
+    at one window plus the target grid, whatever the size of the raster.
+    """
+    n_cells = len(lat) * len(lon)
+    sums = np.zeros(n_cells)
+    counts = np.zeros(n_cells, dtype=np.int64)
+    with rasterio.open(file_path) as src:
+        nodata = default_nodata(src)
+        for window in row_windows(src.height, src.width, window_rows):
+            data = src.read(band, window=window)
+            cells = target_cells(src.transform, data.shape, lat, lon, window.row_off, window.col_off)
+            accumulate(data, nodata, cells, sums, counts)
+    return finalize(sums, counts, (len(lat), len(lon)), method)
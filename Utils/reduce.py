@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+# numba is optional: with it, scatter_add(..., jit=True) accumulates all columns in one compiled loop
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def encode_keys(df, keys):
+    """Encode the key columns as one int64 code per row (mixed radix over the sorted unique values).
+
+    Returns (codes, levels, sizes); rows with a missing key get code -1, like groupby drops them.
+    """
+    codes = np.zeros(len(df), dtype=np.int64)
+    missing = np.zeros(len(df), dtype=bool)
+    levels, sizes = [], []
+    for key in keys:
+        inv, uniq = pd.factorize(df[key], sort=True)
+        codes = codes * max(len(uniq), 1) + inv
+        missing |= inv < 0
+        levels.append(uniq)
+        sizes.append(max(len(uniq), 1))
+    codes[missing] = -1
+    return codes, levels, sizes
+
+
+def compress_codes(codes, sizes, dense_limit=None):
+    """Map key codes to consecutive group ids 0..n_groups-1 in sorted key order.
+
+    The key space is used directly (bincount over all combinations) when it is small compared to the
+    number of rows, otherwise the occurring codes are sorted once with np.unique.
+    Returns (group ids per row, key code of every group).
+    """
+    n_keys = int(np.prod(sizes, dtype=np.int64))
+    if dense_limit is None:
+        dense_limit = max(4 * len(codes), 1 << 20)
+
+    if n_keys <= dense_limit:
+        present = np.bincount(codes, minlength=n_keys) > 0
+        group_codes = np.flatnonzero(present)
+        lookup = np.cumsum(present) - 1
+        return lookup[codes], group_codes
+    group_codes, group = np.unique(codes, return_inverse=True)
+    return group.ravel(), group_codes
+
+
+def scatter_add(group, values, n_groups, jit=False):
+    """Per-group sums (NaN counted as 0) and non-NaN counts of every column of values (rows x columns)."""
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    if jit and numba is not None:
+        return _scatter_add_jit(group, values, n_groups)
+
+    sums = np.empty((n_groups, values.shape[1]))
+    counts = np.empty((n_groups, values.shape[1]), dtype=np.int64)
+    rows = None
+    for j in range(values.shape[1]):
+        valid = ~np.isnan(values[:, j])
+        if valid.all():
+            if rows is None:
+                rows = np.bincount(group, minlength=n_groups)
+            sums[:, j] = np.bincount(group, weights=values[:, j], minlength=n_groups)
+            counts[:, j] = rows
+        else:
+            sums[:, j] = np.bincount(group, weights=np.where(valid, values[:, j], 0.0), minlength=n_groups)
+            counts[:, j] = np.bincount(group[valid], minlength=n_groups)
+    return sums, counts
+
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _scatter_add_jit(group, values, n_groups):
+        sums = np.zeros((n_groups, values.shape[1]))
+        counts = np.zeros((n_groups, values.shape[1]), dtype=np.int64)
+        for i in range(values.shape[0]):
+            g = group[i]
+            for j in range(values.shape[1]):
+                v = values[i, j]
+                if not np.isnan(v):
+                    sums[g, j] += v
+                    counts[g, j] += 1
+        return sums, counts
+
+
+def group_reduce(df, keys, sum_cols=(), mean_cols=(), count=None, as_index=False, jit=False):
+    """Grouped sums and means with integer keys and bincount instead of a pandas groupby.
+
+    Equal to df.groupby(keys)[sum_cols].sum() and df.groupby(keys)[mean_cols].mean() (NaN skipped),
+    up to floating-point summation order. count: name of an extra column with the rows per group.
+    Groups are sorted by key like groupby; as_index=True returns them as the (Multi)Index.
+    """
+    keys, sum_cols, mean_cols = list(keys), list(sum_cols), list(mean_cols)
+    codes, levels, sizes = encode_keys(df, keys)
+    keep = codes >= 0
+    if not keep.all():
+        df, codes = df[keep], codes[keep]
+
+    group, group_codes = compress_codes(codes, sizes)
+    n_groups = len(group_codes)
+    value_cols = sum_cols + [c for c in mean_cols if c not in sum_cols]
+    sums, counts = scatter_add(group, df[value_cols].to_numpy(dtype=np.float64), n_groups, jit=jit)
+
+    out = {}
+    for key, level, pos in zip(keys, levels, np.unravel_index(group_codes, sizes)):
+        out[key] = np.asarray(level)[pos]
+    for j, col in enumerate(value_cols):
+        if col in sum_cols:
+            out[col] = sums[:, j]
+    for col in mean_cols:
+        j = value_cols.index(col)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[col] = sums[:, j] / counts[:, j]
+    if count:
+        out[count] = np.bincount(group, minlength=n_groups)
+
+    result = pd.DataFrame(out)
+    return result.set_index(keys) if as_index else result
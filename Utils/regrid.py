@@ -0,0 +1,113 @@
+import hashlib
+import os
+
+import numpy as np
+import xarray as xr
+
+# Nearest-neighbour cutting of basin grids out of global files, in place of `cdo invertlat` +
+# `cdo remapnn,range.txt`. For each basin the target -> source index map is computed once and
+# cached next to its range.txt; a global file is then read once (the box around all basins) and
+# every basin is taken from it by indexing. The latitude order of the source does not matter:
+# the map points into the source as stored, so no flipped copy is written.
+
+
+def read_griddes(path):
+    """lat and lon axes of a CDO lonlat grid description (xfirst/xinc or xvals, ...)."""
+    keys, name = {}, None
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if "=" in line:
+                name, value = (part.strip() for part in line.split("=", 1))
+                keys[name] = value.split()
+            elif name is not None:
+                keys[name] += line.split()  # continuation of xvals / yvals
+
+    def axis(prefix):
+        if f"{prefix}vals" in keys:
+            return np.array(keys[f"{prefix}vals"], dtype=np.float64)
+        size, first, inc = int(keys[f"{prefix}size"][0]), float(keys[f"{prefix}first"][0]), float(keys[f"{prefix}inc"][0])
+        return first + inc * np.arange(size)
+
+    return axis("y"), axis("x")
+
+
+def coord_names(ds):
+    lat = next(d for d in ds.dims if "lat" in d.lower())
+    lon = next(d for d in ds.dims if "lon" in d.lower())
+    return lat, lon
+
+
+def nearest(src, target, period=None):
+    """Index of the nearest src value for every target value (first one on ties, like argmin)."""
+    diff = target[:, None] - src[None, :]
+    if period is not None:
+        diff = (diff + period / 2) % period - period / 2
+    return np.abs(diff).argmin(axis=1)
+
+
+def index_map(src_lat, src_lon, lat, lon):
+    """(rows, cols) into the source grid of the nearest cell of every target lat and lon."""
+    return nearest(np.asarray(src_lat, dtype=np.float64), lat), nearest(np.asarray(src_lon, dtype=np.float64), lon, period=360.0)
+
+
+def cached_index_map(range_file, src_lat, src_lon):
+    """index_map for a range.txt, cached as .npz next to it (keyed on the grid text and source axes)."""
+    digest = hashlib.sha256()
+    with open(range_file, "rb") as f:
+        digest.update(f.read())
+    digest.update(np.asarray(src_lat, dtype=np.float64).tobytes())
+    digest.update(np.asarray(src_lon, dtype=np.float64).tobytes())
+    cache = os.path.join(os.path.dirname(range_file), f".remapnn_{digest.hexdigest()[:16]}.npz")
+
+    if os.path.exists(cache):
+        with np.load(cache) as saved:
+            return {key: saved[key] for key in ("lat", "lon", "rows", "cols")}
+
+    lat, lon = read_griddes(range_file)
+    rows, cols = index_map(src_lat, src_lon, lat, lon)
+    np.savez(cache + ".tmp.npz", lat=lat, lon=lon, rows=rows, cols=cols)
+    os.replace(cache + ".tmp.npz", cache)
+    return {"lat": lat, "lon": lon, "rows": rows, "cols": cols}
+
+
+def cut_basins(src_file, targets):
+    """Write the nearest-neighbour basin subsets of a global file.
+
+    targets: {basin: (range_file, out_file)}. Each variable on the lat/lon grid is read once, as the
+    box around all basins; variables without lat/lon are copied. Output lat/lon follow range.txt.
+    """
+    with xr.open_dataset(src_file) as ds:
+        lat_name, lon_name = coord_names(ds)
+        maps = {basin: cached_index_map(range_file, ds[lat_name].values, ds[lon_name].values)
+                for basin, (range_file, _) in targets.items()}
+        r0 = min(int(m["rows"].min()) for m in maps.values())
+        r1 = max(int(m["rows"].max()) for m in maps.values()) + 1
+        c0 = min(int(m["cols"].min()) for m in maps.values())
+        c1 = max(int(m["cols"].max()) for m in maps.values()) + 1
+
+        subsets = {basin: {} for basin in targets}
+        for var, da in ds.data_vars.items():
+            if lat_name not in da.dims or lon_name not in da.dims:
+                for basin in targets:
+                    subsets[basin][var] = da.load()
+                continue
+            da = da.transpose(..., lat_name, lon_name)
+            box = da.isel({lat_name: slice(r0, r1), lon_name: slice(c0, c1)}).values
+            other = {d: da[d] for d in da.dims[:-2] if d in da.coords}
+            for basin, m in maps.items():
+                values = box[..., m["rows"][:, None] - r0, m["cols"][None, :] - c0]
+                subsets[basin][var] = xr.DataArray(
+                    values, dims=da.dims[:-2] + ("lat", "lon"),
+                    coords={**other, "lat": m["lat"], "lon": m["lon"]}, attrs=da.attrs)
+        attrs = ds.attrs
+        lat_attrs, lon_attrs = ds[lat_name].attrs, ds[lon_name].attrs
+
+    for basin, (_, out_file) in targets.items():
+        out = xr.Dataset(subsets[basin], attrs=attrs)
+        out["lat"].attrs, out["lon"].attrs = lat_attrs, lon_attrs
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+        out.to_netcdf(out_file)
+    return [out_file for _, out_file in targets.values()]
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+# ---------------- WOFOST output tables ----------------
+# Known columns of each output table. Listed columns are read with compact types:
+# int16 for the calendar, float32 for fluxes and pools; Lat/Lon stay float64 so that
+# merges with the HA masks match exactly (or use the fixed grid categories below).
+# Columns that are not listed are read as pandas infers them.
+coord_cols = ["Lat", "Lon"]
+calendar_cols = ["Year", "Month", "Day"]
+
+annual_cols = coord_cols + ["Year", "Day", "GrowthDay", "Storage",
+               "N_decomp", "N_dep", "N_fix", "N_fert", "NH3", "N2O", "NOx", "N2",
+               "N_surf", "N_sub", "N_leach", "N_uptake", "N_grain",
+               "P_decomp", "P_dep", "P_fert", "LabileP", "StableP", "PrecP", "P_acc",
+               "P_surf", "P_sub", "P_leach", "P_uptake", "P_grain"]
+
+monthly_cols = coord_cols + ["Year", "Month",
+                "SurfaceRunoff", "SubsurfaceRunoff", "Percolation", "Days_Fertilization",
+                "N_uptake", "P_uptake", "N_deficit", "P_deficit", "N_decomp", "P_decomp",
+                "P_Surf", "P_Sub", "P_Leaching",
+                "NH3_ds", "N2O_ds", "NOx_ds", "N_surf_ds", "N_sub_ds", "N_leach_ds"]
+
+daily_cols = coord_cols + ["Year", "Day", "Dev_Stage", "Fertilization",
+              "SoilMoisture", "Transpiration", "RootDepth",
+              "SurfaceRunoff", "SubsurfaceRunoff", "Percolation",
+              "N_demand", "N_avail", "N_uptake", "N_decomp",
+              "P_demand", "P_avail", "P_uptake", "P_Uptake", "P_decomp",
+              "Lpool", "Spool", "P_Surf", "P_Sub", "P_Leaching"]
+
+tables = {"annual": annual_cols, "monthly": monthly_cols, "daily": daily_cols}
+
+# 0.5 degree grid cell centres, as fixed categories for the coordinates
+coord_categories = {
+    "Lat": pd.CategoricalDtype(np.arange(-89.75, 90, 0.5)),
+    "Lon": pd.CategoricalDtype(np.arange(-179.75, 180, 0.5)),
+}
+
+
+def column_dtype(name, coords_as_category=False):
+    if name in calendar_cols:
+        return "int16"
+    if name in coord_cols:
+        return coord_categories[name] if coords_as_category else "float64"
+    return "float32"
+
+
+def table_dtypes(columns, table, coords_as_category=False):
+    """dtype per (raw) CSV header name for the columns listed in the table schema."""
+    listed = tables[table]
+    return {col: column_dtype(col.strip(), coords_as_category)
+            for col in columns if col.strip() in listed}
+
+
+def compact(df, table, coords_as_category=False):
+    """Coerce the listed columns of an untyped frame to the schema (invalid entries -> NaN)."""
+    for col in df.columns:
+        if col not in tables[table]:
+            continue
+        dtype = column_dtype(col, coords_as_category)
+        values = df[col] if isinstance(dtype, pd.CategoricalDtype) else pd.to_numeric(df[col], errors="coerce")
+        # calendar columns with gaps cannot be int16
+        if dtype == "int16" and values.isna().any():
+            dtype = "float32"
+        df[col] = values.astype(dtype)
+    return df
+
+
+def read_table(path, table, usecols=None, chunksize=None, coords_as_category=False):
+    """pd.read_csv for a WOFOST output table ("annual", "monthly" or "daily") with the schema types.
+
+    Header names are stripped. With chunksize an iterator of typed chunks is returned.
+    If a listed column holds non-numeric entries, the file is re-read untyped and
+    coerced (the old pd.to_numeric(errors="coerce") behaviour); chunked reads switch to
+    that from the failing chunk on.
+    """
+    header = pd.read_csv(path, nrows=0, skipinitialspace=True).columns
+    if usecols is not None:
+        header = [c for c in header if c.strip() in usecols]
+        usecols = header
+    dtypes = table_dtypes(header, table, coords_as_category)
+
+    if chunksize is not None:
+        return read_chunks(path, table, dtypes, usecols, chunksize, coords_as_category)
+
+    try:
+        df = pd.read_csv(path, dtype=dtypes, usecols=usecols, skipinitialspace=True)
+    except ValueError:
+        df = pd.read_csv(path, usecols=usecols, skipinitialspace=True, low_memory=False)
+        return compact(strip_columns(df), table, coords_as_category)
+    return strip_columns(df)
+
+
+def read_chunks(path, table, dtypes, usecols, chunksize, coords_as_category=False):
+    """Typed chunks of a CSV. At a chunk that does not parse with the schema types, the file is
+    re-read untyped, the chunks already returned are skipped and the rest are coerced."""
+    done = 0
+    try:
+        for chunk in pd.read_csv(path, dtype=dtypes, usecols=usecols, skipinitialspace=True, chunksize=chunksize):
+            yield strip_columns(chunk)
+            done += 1
+        return
+    except ValueError:
+        pass
+
+    reader = pd.read_csv(path, usecols=usecols, skipinitialspace=True, chunksize=chunksize, low_memory=False)
+    for n, chunk in enumerate(reader):
+        if n >= done:
+            yield compact(strip_columns(chunk), table, coords_as_category)
+
+
+def strip_columns(df):
+    df.columns = df.columns.str.strip()
+    return df
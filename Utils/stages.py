@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from Utils.aggregate import stream_aggregate
+
+# ---------------- Phenology ----------------
+# WOFOST development stage: 0 emergence, 1 anthesis, 2 maturity.
+# Crop N/P demand is only counted up to a crop-specific stage.
+stage_cutoffs = {"soybean": 1.5}
+default_cutoff = 1.3
+
+
+def demand_cutoff(crop):
+    return stage_cutoffs.get(crop, default_cutoff)
+
+
+def stage_windows(crop):
+    """Phenological windows as (low, high, inclusive) on Dev_Stage; inclusive as in Series.between.
+
+    Days with Dev_Stage <= 0 belong to no crop cycle (season_labeler gives them no Season), so
+    the windows starting at 0 are 0 < Dev_Stage: the N/P demand window is 0 < Dev_Stage <= cutoff,
+    where the point plots in S2 (P_Check, 4_Plines) also keep days with Dev_Stage == 0.
+    """
+    return {
+        "emergence_anthesis": (0.0, 1.0, "neither"),
+        "anthesis_maturity": (1.0, 2.0, "both"),
+        "nutrient_demand": (0.0, demand_cutoff(crop), "right"),
+    }
+
+
+def window_mask(low, high, inclusive="both"):
+    """mask(chunk) for stream_aggregate: rows with Dev_Stage between low and high."""
+    return lambda df: df["Dev_Stage"].between(low, high, inclusive=inclusive)
+
+
+def season_labeler():
+    """prepare(chunk) that adds Season: the Year in which each crop cycle emerged (NaN outside the crop).
+
+    A cycle starts where Dev_Stage becomes > 0. Each pixel's rows must come in date order through
+    the file (true for the WOFOST daily CSVs); the last state of every pixel is carried to the next
+    chunk, so cycles that cross a chunk or the turn of the year keep one label. A cycle that is
+    already running at a pixel's first record emerged before the output starts: it is labelled
+    with the previous year and is incomplete.
+    """
+    state = {"last": None}
+
+    def label(df):
+        df = df.sort_values(["Lat", "Lon", "Year", "Day"], kind="stable").reset_index(drop=True)
+        lat, lon = df["Lat"].to_numpy(), df["Lon"].to_numpy()
+        year = df["Year"].to_numpy(dtype=np.float64)
+        in_crop = (df["Dev_Stage"] > 0).to_numpy()
+
+        first = np.ones(len(df), dtype=bool)
+        first[1:] = (lat[1:] != lat[:-1]) | (lon[1:] != lon[:-1])
+        prev_in = np.zeros(len(df), dtype=bool)
+        prev_in[1:] = in_crop[:-1]
+        season = np.full(len(df), np.nan)
+
+        # continue the cycles that were running at the end of the previous chunk
+        prev_in[first] = False
+        no_history = first.copy()
+        if state["last"] is not None:
+            carried = df.loc[first, ["Lat", "Lon"]].merge(state["last"], on=["Lat", "Lon"], how="left")
+            prev_in[first] = carried["in_crop"].eq(True).to_numpy()
+            season[first] = carried["Season"].to_numpy(dtype=np.float64)
+            no_history[first] = carried["in_crop"].isna().to_numpy()
+
+        start = in_crop & ~prev_in
+        season[start] = year[start]
+        season[start & no_history] -= 1
+        season[~first & ~start] = np.nan
+        pixel = np.cumsum(first)
+        season = pd.Series(season).groupby(pixel).ffill().to_numpy(copy=True)
+        season[~in_crop] = np.nan
+        df["Season"] = season
+
+        is_last = np.append(first[1:], True)
+        last = df.loc[is_last, ["Lat", "Lon", "Season"]].assign(in_crop=in_crop[is_last])
+        frames = [last] if state["last"] is None else [state["last"], last]
+        state["last"] = pd.concat(frames).drop_duplicates(["Lat", "Lon"], keep="last")
+        return df
+
+    return label
+
+
+def stream_stage_aggregate(csv_file, crop, sum_cols, windows=None, derived=None, memory_budget_mb=None, table="daily"):
+    """Sums of daily variables per pixel, crop season and phenological window, in one pass over the CSV.
+
+    windows: {name: (low, high, inclusive)} on Dev_Stage, default stage_windows(crop).
+    derived: {column: func(chunk)} as in stream_aggregate, e.g. deficits.
+    Returns one row per Lat, Lon, Season (emergence year) and Window with the sums and Days in the window.
+    """
+    windows = stage_windows(crop) if windows is None else windows
+    derived = {"Days": lambda df: np.ones(len(df), dtype=np.int32), **(derived or {})}
+    products = {
+        name: {"keys": ["Lat", "Lon", "Season"], "sum_cols": list(sum_cols) + ["Days"], "mask": window_mask(*bounds)}
+        for name, bounds in windows.items()
+    }
+
+    results = stream_aggregate(csv_file, products, derived=derived, prepare=season_labeler(),
+                               memory_budget_mb=memory_budget_mb, table=table)
+
+    frames = [res.assign(Window=name) for name, res in results.items()]
+    out = pd.concat(frames, ignore_index=True)
+    out["Season"] = out["Season"].astype(np.int16)
+    out["Days"] = out["Days"].astype(np.int32)
+    return out[["Lat", "Lon", "Season", "Window"] + list(sum_cols) + ["Days"]]
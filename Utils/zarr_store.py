@@ -0,0 +1,136 @@
+import os
+import glob
+import xarray as xr
+import zarr
+from xarray.backends import ZarrStore
+
+# ------------------- USER SETTINGS -------------------
+basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
+crops = ["winterwheat", "maize", "mainrice", "secondrice", "soybean"]
+
+scenario_root = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios"
+store_path = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/3_Scenarios/RQ1_Scenarios.zarr"
+# -----------------------------------------------------
+
+# One chunk holds all years of a 64 x 64 pixel tile, so a yearly map and a
+# per-pixel time series both touch only a few chunks (-1: whole dimension)
+chunk_sizes = {"year": -1, "lat": 64, "lon": 64}
+
+
+def find_scenarios(root):
+    """Scenario folders below root that hold *_annual.nc files, e.g. '2_1_Baseline', '2_3_Rainfed/Red_02'."""
+    files = glob.glob(os.path.join(root, "**", "*_annual.nc"), recursive=True)
+    return sorted({os.path.dirname(os.path.relpath(f, root)) for f in files})
+
+
+def group_name(scenario, basin, crop):
+    return f"{scenario}/{basin}/{crop}"
+
+
+def source_file(root, scenario, basin, crop):
+    return os.path.join(root, scenario, f"{basin}_{crop}_annual.nc")
+
+
+def chunk_encoding(ds):
+    encoding = {}
+    for var in ds.data_vars:
+        chunks = []
+        for dim in ds[var].dims:
+            size = chunk_sizes.get(dim.lower(), -1)
+            chunks.append(ds.sizes[dim] if size == -1 else min(size, ds.sizes[dim]))
+        encoding[var] = {"chunks": tuple(chunks)}
+    return encoding
+
+
+def build_store(root, store, scenarios=None):
+    """Copy {scenario}/{basin}_{crop}_annual.nc files into one Zarr store with a group per
+    scenario/basin/crop, then consolidate the metadata of all groups into the root.
+
+    Groups already in the store are kept; the listed scenarios are (re)written.
+    """
+    if scenarios is None:
+        scenarios = find_scenarios(root)
+
+    written, sources = [], {}
+    for scenario in scenarios:
+        for basin in basins:
+            for crop in crops:
+                nc_file = source_file(root, scenario, basin, crop)
+                if not os.path.exists(nc_file):
+                    continue
+                with xr.open_dataset(nc_file) as ds:
+                    ds = ds.load()
+                # drop the netCDF storage settings, the store sets its own chunks
+                for var in ds.variables:
+                    ds[var].encoding = {}
+                ds.to_zarr(store, group=group_name(scenario, basin, crop), mode="w",
+                           encoding=chunk_encoding(ds), consolidated=False)
+                written.append(group_name(scenario, basin, crop))
+                sources[group_name(scenario, basin, crop)] = os.path.getmtime(nc_file)
+                print(f"  stored {nc_file}")
+
+    # the list of groups and the mtime of the NetCDF each was copied from live in the root
+    # attributes, so readers never walk the directories and can tell outdated groups
+    root_group = zarr.open_group(store, mode="a")
+    root_group.attrs["groups"] = sorted(set(root_group.attrs.get("groups", [])) | set(written))
+    root_group.attrs["sources"] = {**root_group.attrs.get("sources", {}), **sources}
+    zarr.consolidate_metadata(store)
+    return written
+
+
+def list_groups(store):
+    """All scenario/basin/crop groups in the store, from the consolidated metadata."""
+    return list(zarr.open_consolidated(store).attrs.get("groups", []))
+
+
+def open_group(store, scenario, basin, crop):
+    """Lazily open one scenario/basin/crop Dataset."""
+    return xr.open_zarr(store, group=group_name(scenario, basin, crop), consolidated=True)
+
+
+def open_scenarios(store, basin, crop, scenarios=None, variables=None, source_root=None):
+    """Stack one basin-crop across scenarios along a new 'scenario' dimension (lazy).
+
+    The consolidated root is opened once and every scenario group is taken from it, so the
+    metadata is read a single time. With source_root (the folder the store was built from), a
+    scenario whose group is missing, or older than its {basin}_{crop}_annual.nc, is read from
+    the NetCDF instead. Other missing scenarios are skipped; None if no scenario is found.
+    """
+    if os.path.exists(store):
+        root = zarr.open_consolidated(store)
+        groups, built = set(root.attrs.get("groups", [])), root.attrs.get("sources", {})
+    elif source_root is not None:
+        root, groups, built = None, set(), {}
+    else:
+        raise FileNotFoundError(f"No Zarr store at {store}")
+    if scenarios is None:
+        suffix = f"/{basin}/{crop}"
+        scenarios = sorted(g[:-len(suffix)] for g in groups if g.endswith(suffix))
+
+    datasets, outdated = [], []
+    for scenario in scenarios:
+        name = group_name(scenario, basin, crop)
+        nc_file = None if source_root is None else source_file(source_root, scenario, basin, crop)
+        if nc_file is not None and os.path.exists(nc_file) and (
+                name not in groups or built.get(name, -1) < os.path.getmtime(nc_file)):
+            outdated.append(name)
+            ds = xr.open_dataset(nc_file, chunks={})
+        elif name in groups:
+            ds = xr.open_dataset(ZarrStore(root[name]), chunks={})
+        else:
+            print(f"Missing {name} in {store}")
+            continue
+        if variables is not None:
+            ds = ds[variables]
+        datasets.append(ds.expand_dims(scenario=[scenario]))
+    if outdated:
+        print(f"Read from NetCDF, not in {store} or older there (rerun Utils/zarr_store.py): {', '.join(outdated)}")
+    if not datasets:
+        return None
+    return xr.concat(datasets, dim="scenario", join="outer")
+
+
+# ------------------- MAIN -------------------
+if __name__ == "__main__":
+    written = build_store(scenario_root, store_path)
+    print(f"Saved {len(written)} groups to {store_path}")
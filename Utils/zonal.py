@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from Utils.cube import axis_index
+
+# Basin statistics weighted by harvested area. pixel_index lists the cropland pixels of a mask
+# (HA > threshold) with their weights once per basin-crop; zonal_stats then places the table rows
+# on those pixels and gets the weighted totals of all variables and groups (e.g. years) as one
+# matrix-vector product, instead of a merge on float Lat/Lon and a loop per year and variable.
+
+
+def pixel_index(ha, threshold=0.0, valid=None):
+    """Sparse index of the pixels of a (lat, lon) HA DataArray with HA > threshold.
+
+    valid: optional boolean (lat, lon) DataArray that further restricts the pixels,
+    e.g. bulk_density.notnull().
+    """
+    ha = ha.transpose("lat", "lon")
+    values = ha.values.astype(np.float64)
+    keep = values > threshold
+    if valid is not None:
+        keep &= np.asarray(valid.transpose("lat", "lon").values, dtype=bool)
+
+    rows, cols = np.nonzero(keep)
+    lookup = np.full(values.shape, -1, dtype=np.int64)
+    lookup[rows, cols] = np.arange(len(rows))
+    return {
+        "lat": ha["lat"].values, "lon": ha["lon"].values,
+        "rows": rows, "cols": cols, "lookup": lookup,
+        "weight": values[rows, cols],
+    }
+
+
+def pixel_values(index, da):
+    """Values of a (lat, lon) DataArray at the indexed pixels, e.g. to combine with the HA weights."""
+    return da.transpose("lat", "lon").values[index["rows"], index["cols"]].astype(np.float64)
+
+
+def pixel_positions(index, df):
+    """Position of every table row in the index, -1 where its Lat/Lon is not an indexed pixel."""
+    i = axis_index(df["Lat"].to_numpy(), index["lat"])
+    j = axis_index(df["Lon"].to_numpy(), index["lon"])
+    on_grid = (i >= 0) & (j >= 0)
+    pos = np.full(len(df), -1, dtype=np.int64)
+    pos[on_grid] = index["lookup"][i[on_grid], j[on_grid]]
+    return pos
+
+
+def zonal_stats(df, index, variables, by=None, weight=None):
+    """Weighted means and totals of table columns over the indexed pixels.
+
+    by: column to group by (e.g. "Year"), None for one value over the whole table.
+    weight: per-pixel weights, default the HA of the index (e.g. index["weight"] * bulk density).
+    A pixel counts for a variable only where it has a value, so mean = sum(x * w) / sum(w) over the
+    pixels with data, like (merged[col] * merged["HA"]).sum() / merged["HA"].sum() after an inner merge.
+    The table holds at most one row per pixel and group (as the annual and averaged tables do).
+    Returns (means, totals): DataFrames indexed by the by values, or Series when by is None.
+    """
+    variables = list(variables)
+    weight = index["weight"] if weight is None else np.asarray(weight, dtype=np.float64)
+
+    pos = pixel_positions(index, df)
+    keep = pos >= 0
+    if by is None:
+        group, labels = np.zeros(keep.sum(), dtype=np.int64), [None]
+    else:
+        group, labels = pd.factorize(df[by].to_numpy()[keep], sort=True)
+
+    # (group, variable, pixel) matrix, contracted with the weights
+    grid = np.full((len(labels), len(variables), len(weight)), np.nan)
+    grid[group, :, pos[keep]] = df[variables].to_numpy(dtype=np.float64)[keep]
+    valid = ~np.isnan(grid)
+    totals = np.where(valid, grid, 0.0) @ weight
+    area = valid.astype(np.float64) @ weight
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(area > 0, totals / area, np.nan)
+
+    if by is None:
+        return pd.Series(means[0], index=variables), pd.Series(totals[0], index=variables)
+    labels = pd.Index(labels, name=by)
+    return pd.DataFrame(means, index=labels, columns=variables), pd.DataFrame(totals, index=labels, columns=variables)
+
+
+def weighted_trajectory(df, index, variables, weight=None, by="Year", nan_as_zero=False):
+    """Weighted mean of every variable per year over the indexed pixels, with weighted bincounts
+    over the year index. Works on long tables without building a (year, pixel) matrix.
+
+    weight: per-pixel weights, default the HA of the index. Pixels without a value are left out
+    of that year's denominator, as in zonal_stats; with nan_as_zero they count as 0 and keep their
+    weight in the denominator, like (g[x] * g["HA"]).sum() / g["HA"].sum() per year in pandas.
+    Returns one row per year, sorted.
+    """
+    weight = index["weight"] if weight is None else np.asarray(weight, dtype=np.float64)
+    pos = pixel_positions(index, df)
+    keep = pos >= 0
+    year, years = pd.factorize(df[by].to_numpy()[keep], sort=True)
+    w = weight[pos[keep]]
+    rows = (year >= 0) & ~np.isnan(w)  # rows without a year are dropped, as groupby does
+
+    out = {by: np.asarray(years)}
+    for var in variables:
+        x = df[var].to_numpy(dtype=np.float64)[keep]
+        valid = rows & ~np.isnan(x)
+        total = np.bincount(year[valid], weights=x[valid] * w[valid], minlength=len(years))
+        counted = rows if nan_as_zero else valid
+        area = np.bincount(year[counted], weights=w[counted], minlength=len(years))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[var] = np.where(area > 0, total / area, np.nan)
+    return pd.DataFrame(out)
+
+
+def pool_trajectory(df, index, bulk_density, pools=("LabileP", "StableP"), fluxes=("P_decomp", "P_fert")):
+    """Yearly basin averages of soil pools (weighted with HA x bulk density) and fluxes (weighted with HA).
+
+    Missing values count as 0 over the full HA (x BD) of the year, as in the original per-year
+    pandas sums of the P pool scripts.
+    """
+    pool_weight = index["weight"] * pixel_values(index, bulk_density)
+    pool_ts = weighted_trajectory(df, index, pools, weight=pool_weight, nan_as_zero=True)
+    flux_ts = weighted_trajectory(df, index, fluxes, nan_as_zero=True)
+    return pool_ts.merge(flux_ts, on="Year")
@@ -8,6 +8,7 @@
 #-----------------------------Required resources-----------------------
 #SBATCH --time=60
 #SBATCH --mem=25000
+#SBATCH --cpus-per-task=8
 
 #--------------------Environment, Operations and Job steps-------------
 source /home/WUR/zhou111/miniconda3/etc/profile.d/conda.sh
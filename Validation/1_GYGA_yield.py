@@ -1,7 +1,13 @@
 import pandas as pd
 import xarray as xr
-import numpy as np
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.climatology import table_climatology, window_frame
+from Utils.quantiles import percentile_table
+from Utils.parquet_store import load_output
+from Utils.parallel import run_basin_crop
 
 basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
 crops = ["winterwheat", "maize", "mainrice", "soybean", "secondrice"]
@@ -12,49 +18,56 @@ vars_interest = ["Storage","GrowthDay","N_decomp","N_dep","N_fix","N_fert","NH3"
                  "P_decomp","P_dep","P_fert","LabileP","StableP","PrecP","P_acc",
                  "P_surf","P_sub","P_leach","P_uptake"]
 
-for basin in basins:
-    for crop in crops:
-        csv_file = f"/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Ya-Limited-Irrigation/{basin}_{crop}_annual.csv"
-        mask_file = f"/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea/{basin}/Mask/{basin}_{crop}_mask.nc"
-        out_file = f"/lustre/nobackup/WUR/ESG/zhou111/4_RQ1_Analysis_Results/1_Validation/GYGA/{basin}_{crop}_GYGA_Ya-Limited-Irrigation.csv"
+# Peak memory [MB] of one basin-crop task; sizes the process pool
+task_memory_mb = 2000
+
+
+def process(basin, crop):
+    csv_file = f"/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Ya-Limited-Irrigation/{basin}_{crop}_annual.csv"
+    mask_file = f"/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea/{basin}/Mask/{basin}_{crop}_mask.nc"
+    out_file = f"/lustre/nobackup/WUR/ESG/zhou111/4_RQ1_Analysis_Results/1_Validation/GYGA/{basin}_{crop}_GYGA_Ya-Limited-Irrigation.csv"
+
+    # Skip if files don’t exist
+    if not os.path.exists(csv_file) or not os.path.exists(mask_file):
+        print(f"Skipping {basin}-{crop} (file missing)")
+        return
+
+    print(f"Processing {basin}-{crop} ...")
 
-        # Skip if files don’t exist
-        if not os.path.exists(csv_file) or not os.path.exists(mask_file):
-            print(f"Skipping {basin}-{crop} (file missing)")
-            continue
+    # 1) Load mask and select HA > 2500
+    ds_mask = xr.open_dataset(mask_file)
+    HA = ds_mask["HA"]
+    mask_pixels = HA.where(HA > 2500).dropna(dim="lat", how="all").dropna(dim="lon", how="all")
+    mask_df = mask_pixels.to_dataframe().reset_index()
+    mask_df = mask_df.dropna(subset=["HA"])
 
-        print(f"Processing {basin}-{crop} ...")
+    # 2) Load model CSV
+    df = load_output(csv_file, "annual", columns=["Lat", "Lon", "Year"] + vars_interest, years=(1986, 2015))
 
-        # 1) Load mask and select HA > 2500
-        ds_mask = xr.open_dataset(mask_file)
-        HA = ds_mask["HA"]
-        mask_pixels = HA.where(HA > 2500).dropna(dim="lat", how="all").dropna(dim="lon", how="all")
-        mask_df = mask_pixels.to_dataframe().reset_index()
-        mask_df = mask_df.dropna(subset=["HA"])
+    # 3) Mean per pixel over 1986-2015
+    clim = table_climatology(df, vars_interest)
+    df_mean = window_frame(clim, vars_interest, 1986, 2015)
 
-        # 2) Load model CSV
-        df = pd.read_csv(csv_file)
-        df = df[(df["Year"] >= 1986) & (df["Year"] <= 2015)]
+    # 4) Keep only pixels with HA > 2500
+    df_valid = df_mean.merge(mask_df[["lat","lon"]], left_on=["Lat","Lon"], right_on=["lat","lon"], how="inner")
 
-        # 3) Mean per pixel
-        df_mean = df.groupby(["Lat","Lon"])[vars_interest].mean().reset_index()
+    if df_valid.empty:
+        print(f"No valid pixels for {basin}-{crop}, skipping.")
+        return
 
-        # 4) Keep only pixels with HA > 2500
-        df_valid = df_mean.merge(mask_df[["lat","lon"]], left_on=["Lat","Lon"], right_on=["lat","lon"], how="inner")
+    # 5) Compute percentiles
+    table = percentile_table(df_valid, vars_interest, (10, 90)).set_index("Variable")
+    percentiles = {}
+    for v in vars_interest:
+        percentiles[f"{v}_10"], percentiles[f"{v}_90"] = table.loc[v, "P10"], table.loc[v, "P90"]
 
-        if df_valid.empty:
-            print(f"No valid pixels for {basin}-{crop}, skipping.")
-            continue
+    # 6) Save
+    out_df = pd.DataFrame([percentiles])
+    os.makedirs(os.path.dirname(out_file), exist_ok=True)
+    out_df.to_csv(out_file, index=False)
 
-        # 5) Compute percentiles
-        percentiles = {}
-        for v in vars_interest:
-            percentiles[f"{v}_10"] = np.percentile(df_valid[v], 10)
-            percentiles[f"{v}_90"] = np.percentile(df_valid[v], 90)
+    print(f"Saved results -> {out_file}")
 
-        # 6) Save
-        out_df = pd.DataFrame([percentiles])
-        os.makedirs(os.path.dirname(out_file), exist_ok=True)
-        out_df.to_csv(out_file, index=False)
 
-        print(f"Saved results -> {out_file}")
+if __name__ == "__main__":
+    run_basin_crop(process, basins, crops, task_memory_mb=task_memory_mb)
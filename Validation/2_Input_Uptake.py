@@ -2,6 +2,11 @@ import os
 import numpy as np
 import pandas as pd
 import xarray as xr
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.quantiles import quantiles, sketch_table
+from Utils.parquet_store import load_output
 
 # ------------------- USER SETTINGS -------------------
 basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
@@ -45,16 +50,12 @@ def read_mask(basin, crop):
 def read_scenario(path):
     if not os.path.exists(path):
         return pd.DataFrame()
-    df = pd.read_csv(path)
+    df = load_output(path, "annual", years=(year_min, year_max),
+                     columns=["Lat", "Lon", "Year", "Storage", "N_fert", "N_dep", "N_uptake",
+                              "P_fert", "P_dep", "P_leach"])
     df.columns = [c.strip() for c in df.columns]
     df = df.rename(columns={"lat":"Lat","latitude":"Lat","y":"Lat",
                             "lon":"Lon","longitude":"Lon","x":"Lon"})
-    df = df[(df["Year"] >= year_min) & (df["Year"] <= year_max)]
-
-    # Force numeric for relevant columns
-    for col in ["Storage","N_uptake","P_leach","N_fert","N_dep","P_fert","P_dep"]:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
 
     return df
 
@@ -110,11 +111,10 @@ def compute_summary(basin, crop):
             subset = merged[merged["Category"]==cat]
             if subset.empty:
                 continue
-            for var in ["N_uptake","N_input","P_input","P_uptake"]:
-                vals = subset[var].dropna().values
-                if vals.size == 0:
+            for var, sk in sketch_table(subset, ["N_uptake","N_input","P_input","P_uptake"]).items():
+                if sk["n"] == 0:
                     continue
-                p10, p90 = np.percentile(vals,[10,90])
+                p10, p90 = quantiles(sk, [10, 90])
                 records.append([scenario, cat, var, 10, p10])
                 records.append([scenario, cat, var, 90, p90])
 
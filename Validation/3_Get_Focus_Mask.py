@@ -2,6 +2,11 @@ import pandas as pd
 import xarray as xr
 import numpy as np
 from pathlib import Path
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.parquet_store import load_output
 
 # Parameters
 basins = ["Indus", "Yangtze", "LaPlata", "Rhine"]
@@ -23,8 +28,7 @@ base_yar  = "/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Ya-Rainfed"
 
 # Helper: load and average
 def load_avg(path):
-    df = pd.read_csv(path)
-    df = df[df["Year"].between(1986, 2015)]
+    df = load_output(path, "annual", columns=["Lat", "Lon", "Storage"], years=(1986, 2015))
     grouped = df.groupby(["Lat", "Lon"])["Storage"].mean().reset_index()
     return grouped
 
@@ -1,7 +1,10 @@
-import pandas as pd
 import xarray as xr
-import numpy as np
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.quantiles import merge_tables, sketch_table, summary
+from Utils.parquet_store import load_output
 
 basins = ["LaPlata", "Indus", "Yangtze", "Rhine"]
 crops = ["mainrice",  "secondrice", "winterwheat", "soybean", "maize"]
@@ -9,11 +12,20 @@ crops = ["mainrice",  "secondrice", "winterwheat", "soybean", "maize"]
 startyear = 1986
 endyear = 2015
 
+# Model columns the validation variables are built from
+model_variables = ["N_fert", "N_surf", "N_sub", "N_leach", "N_uptake", "NH3", "N2O", "NOx", "N2",
+                   "P_acc", "P_surf", "P_sub", "P_leach", "P_uptake"]
+
+out_dir = "/lustre/nobackup/WUR/ESG/zhou111/4_RQ1_Analysis_Results/1_Validation/NP_balance"
+
+# Percentile sketches of every basin-crop, pooled into one table at the end
+pooled = []
+
 for basin in basins:
     for crop in crops:
         csv_file = f"/lustre/nobackup/WUR/ESG/zhou111/3_RQ1_Model_Outputs/Output_Unsus_Irrigation/{basin}_{crop}_annual.csv"
         mask_file = f"/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea/{basin}/Mask/{basin}_{crop}_mask.nc"
-        out_file = f"/lustre/nobackup/WUR/ESG/zhou111/4_RQ1_Analysis_Results/1_Validation/NP_balance/{basin}_{crop}_NP.csv"
+        out_file = os.path.join(out_dir, f"{basin}_{crop}_NP.csv")
 
         # Skip if files don’t exist
         if not os.path.exists(csv_file) or not os.path.exists(mask_file):
@@ -30,8 +42,7 @@ for basin in basins:
         mask_df = mask_df.dropna(subset=["HA"])
 
         # 2) Load model CSV
-        df = pd.read_csv(csv_file)
-        df = df[(df["Year"] >= startyear) & (df["Year"] <= endyear)]
+        df = load_output(csv_file, "annual", columns=["Lat", "Lon"] + model_variables, years=(startyear, endyear))
 
         # 3) Validation variabled
         df["N_app"] = df["N_fert"] + df["N_surf"] + df["N2O"] + df["NOx"] + df["NH3"] + df ["N2"]
@@ -60,16 +71,18 @@ for basin in basins:
             continue
 
         # 5) Compute percentiles and structure output
-        rows = []
-        for v in val_variables:
-            p10 = np.percentile(df_valid[v], 10)
-            p90 = np.percentile(df_valid[v], 90)
-            rows.append({"Variable": v, "P10": p10, "P90": p90})
-
-        out_df = pd.DataFrame(rows)
+        sketches = sketch_table(df_valid, val_variables)
+        pooled.append(sketches)
+        out_df = summary(sketches, (10, 90))
 
         # 6) Save
         os.makedirs(os.path.dirname(out_file), exist_ok=True)
         out_df.to_csv(out_file, index=False)
 
         print(f"Saved results -> {out_file}")
+
+# 7) Percentiles over all basins and crops, from the merged sketches
+if pooled:
+    out_file = os.path.join(out_dir, "All_basins_crops_NP.csv")
+    summary(merge_tables(*pooled), (10, 90)).to_csv(out_file, index=False)
+    print(f"Saved pooled results -> {out_file}")
@@ -5,9 +5,12 @@
 
 import os
 import numpy as np
-import pandas as pd
 import xarray as xr
 import matplotlib.pyplot as plt
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from Utils.parquet_store import load_output
 
 data_dir = "/lustre/nobackup/WUR/ESG/zhou111/2_RQ1_Data/2_StudyArea"
 
@@ -82,8 +85,8 @@ for basin in basins:
 
         # Calculate the WOFOST-Simulated N, P losses through water flux (surface runoff, subsurface runoff, leaching)
         WOFOST_output = f"{WOFOST_dir}/{basin}_{crop}_annual.csv"
-        WOFOST_df = pd.read_csv(WOFOST_output)
-        WOFOST_df = WOFOST_df[(WOFOST_df["Year"] >= 2010) &(WOFOST_df["Year"] <= 2019)]
+        WOFOST_df = load_output(WOFOST_output, "annual", years=(2010, 2019),
+                                columns=["Lat", "Lon", "N_surf", "N_sub", "N_leach", "P_surf", "P_sub", "P_leach"])
 
         WOFOST_df["N_water"] = WOFOST_df["N_surf"] + WOFOST_df["N_sub"] + WOFOST_df["N_leach"] # kg N/ha 
         WOFOST_df["N_runoff"] = WOFOST_df["N_surf"] + WOFOST_df["N_sub"] 